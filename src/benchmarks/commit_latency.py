@@ -0,0 +1,76 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    measures the latency of small commits (like TaskModel.add_task_revision())
+    with the default sqlite3 settings and with a tuned connection profile
+
+    usage (in src): python -m benchmarks.commit_latency [<number of commits>] [<dir for the temp. db>]
+"""
+
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+from tasks.db import DB, Row
+from tasks.metamodel import MetaModel
+
+_ETC_DPATH = Path(__file__).resolve().parent.parent.parent / 'etc'
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    'default': {},
+    'tuned': {'journal_mode': 'wal', 'synchronous': 'normal', 'cache_size': -16000, 'mmap_size': 268435456},
+}
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) >= 2 else 200
+    temp_root = sys.argv[2] if len(sys.argv) >= 3 else None
+
+    meta_model = MetaModel()
+    meta_model.read(_ETC_DPATH / 'tasks.ini')
+    for profile_name, pragmas in PROFILES.items():
+        with tempfile.TemporaryDirectory(dir=temp_root) as temp_dname:
+            latencies = measure_commits(Path(temp_dname) / 'tasks.sqlite', meta_model, pragmas, n)
+        print(f'{profile_name:8}: mean={statistics.mean(latencies):.3f} ms, '
+              f'median={statistics.median(latencies):.3f} ms, max={max(latencies):.3f} ms  ({n} commits)')
+
+
+def measure_commits(sqlite_path: Path, meta_model: MetaModel, pragmas: Dict[str, Any], n: int) -> List[float]:
+    db = DB(sqlite_path, meta_model, connection_pragmas=pragmas)
+    db.create()
+    db.conn.close()
+    db.open()
+
+    table = db.table('tasks_revisions')
+    latencies = []
+    for i in range(n):
+        row = Row({'task_serial': i + 1, 'rev_no': 1, 'date': '200101', 'category': 'work',
+                   'title': f'task {i}', 'body': '<paragraph>some text</paragraph>', 'group_serial': 0}, table)
+        t0 = time.perf_counter()
+        table.insert_row(row)
+        db.commit()
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    db.conn.close()
+    return latencies
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    compares the os.scandir() based walker (tasks.walking) with the former
+    Path.iterdir() + is_dir() + stat() walk on a synthetic tasks root
+
+    usage (in src): python -m benchmarks.walk [<number of files>] [<dir for the temp. tree>]
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator, Tuple, Callable
+
+from tasks.caching import TaskCacheManager, TaskDir
+from tasks.walking import walk
+
+_TASKS_PER_CATEGORY = 50
+_FILES_PER_DIR = 50
+_DIRS_PER_TASK = 4
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) >= 2 else 100000
+    temp_root = sys.argv[2] if len(sys.argv) >= 3 else None
+
+    with tempfile.TemporaryDirectory(dir=temp_root) as temp_dname:
+        root = Path(temp_dname)
+        print(f'creating {n} files...')
+        create_tree(root, n)
+        task_dpaths = [task_resource.path for task_resource in TaskCacheManager(root).read_resources()]
+        print(f'{len(task_dpaths)} task dirs')
+
+        measure('pathlib listing', lambda: sum(1 for dpath in task_dpaths for _ in _iter_pathlib(dpath)))
+        measure('scandir listing', lambda: sum(1 for dpath in task_dpaths for _ in walk(dpath)))
+        measure('pathlib stamps', lambda: [_read_pathlib_stamp(dpath) for dpath in task_dpaths])
+        measure('scandir stamps', lambda: [TaskDir(dpath).read_stamp() for dpath in task_dpaths])
+        measure('resources', lambda: TaskCacheManager(root).read_resources())
+
+
+def create_tree(root: Path, n: int) -> None:
+    files_per_task = _FILES_PER_DIR * (_DIRS_PER_TASK + 1)
+    n_tasks = max(1, n // files_per_task)
+    for task_no in range(n_tasks):
+        category_dpath = root / f'category{task_no // _TASKS_PER_CATEGORY}'
+        task_dpath = category_dpath / f'2001{task_no % 100:02}-task{task_no}'
+        sub_dpaths = [task_dpath] + [task_dpath / f'dir{i}' for i in range(_DIRS_PER_TASK)]
+        for dpath in sub_dpaths:
+            dpath.mkdir(parents=True)
+            for file_no in range(_FILES_PER_DIR):
+                (dpath / f'file{file_no}.txt').write_bytes(b'x' * file_no)
+
+
+def measure(name: str, func: Callable[[], object]) -> None:
+    t0 = time.perf_counter()
+    func()
+    print(f'{name:16}: {(time.perf_counter() - t0) * 1000.0:8.1f} ms')
+
+
+def _iter_pathlib(dpath: Path, level: int = 0) -> Iterator[Tuple[int, str]]:
+    for item in dpath.iterdir():
+        yield level, item.name
+        if item.is_dir():
+            yield from _iter_pathlib(item, level + 1)
+
+
+def _read_pathlib_stamp(dpath: Path) -> Tuple[float, int]:
+    max_mtime = dpath.stat().st_mtime
+    total_size = 0
+    for item in dpath.rglob('*'):
+        item_stat = item.stat()
+        max_mtime = max(max_mtime, item_stat.st_mtime)
+        if not item.is_dir():
+            total_size += item_stat.st_size
+    return max_mtime, total_size
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    zips a task folder with several compression policies and reports the ratio and time of each
+
+    usage (in src): python -m benchmarks.zip_policies <task dir> [<number of workers>] [<dir for the temp. zips>]
+    The task folder isn't changed, the zip files are written to a temp. dir.
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+from zipfile import ZIP_BZIP2, ZIP_LZMA
+
+from tasks.walking import walk
+from tasks.zipping import Zipper, CompressionPolicy, LEGACY_POLICY
+
+POLICIES: Dict[str, CompressionPolicy] = {
+    'legacy (deflate 6)': LEGACY_POLICY,
+    'default': CompressionPolicy(),
+    'deflate 1': CompressionPolicy(default_level=1),
+    'deflate 9/6/1': CompressionPolicy(default_level=1, size_levels=[(1024 * 1024, 9), (64 * 1024 * 1024, 6)]),
+    'bzip2 9': CompressionPolicy(compression=ZIP_BZIP2, default_level=9),
+    'lzma': CompressionPolicy(compression=ZIP_LZMA),
+}
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    source_dpath = Path(sys.argv[1]).resolve()
+    max_workers = int(sys.argv[2]) if len(sys.argv) >= 3 else 1
+    temp_root = sys.argv[3] if len(sys.argv) >= 4 else None
+
+    total_size = sum(entry.size for entry in walk(source_dpath, with_stat=True) if not entry.is_dir)
+    print(f'{source_dpath}: {total_size / 1024 / 1024:.1f} MiB, {max_workers} worker(s)')
+    for policy_name, policy in POLICIES.items():
+        with tempfile.TemporaryDirectory(dir=temp_root) as temp_dname:
+            zip_fpath = Path(temp_dname) / (source_dpath.name + '.zip')
+            t0 = time.perf_counter()
+            Zipper(source_dpath, max_workers=max_workers, policy=policy, zip_fpath=zip_fpath).start()
+            duration = time.perf_counter() - t0
+            zip_size = zip_fpath.stat().st_size
+        ratio = zip_size / total_size if total_size else 1.0
+        print(f'{policy_name:20}: ratio={ratio:6.3f}, time={duration:7.2f} s')
+
+
+if __name__ == '__main__':
+    main()
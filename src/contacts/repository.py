@@ -58,15 +58,16 @@ from __future__ import annotations
 import sqlite3
 import time
 from pathlib import Path
-from typing import Dict, Set, Optional, Iterable, Tuple
+from typing import Dict, Set, Optional, Iterable, Tuple, Any
 
 from contacts.basetypes import VagueDate, Fact
 
 
 class Repository:
 
-    def __init__(self, db_source=':memory:'):
+    def __init__(self, db_source=':memory:', connection_pragmas: Optional[Dict[str, Any]] = None):
         self._db_source = db_source
+        self._connection_pragmas = connection_pragmas or {}
         self._revisions: Dict[int, Revision] = {}
         self._logging_enabled: bool = False
         self._create_conn()
@@ -79,6 +80,8 @@ class Repository:
         exists_db = self._exists_db()
         self._conn = sqlite3.connect(str(self._db_source))
         self._conn.row_factory = sqlite3.Row
+        for name, value in self._connection_pragmas.items():
+            self._execute_sql(f'pragma {name} = {value}')
         if not exists_db:
             self._create_db()
 
@@ -16,19 +16,24 @@
 # along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
 
 from __future__ import annotations
-from dataclasses import dataclass
+import re
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Tuple, Dict, Optional
+from typing import Tuple, Dict, Optional, Any
 import yaml
 
 from contacts.contactmodel import ContactModel
 from contacts.repository import Repository
+from pysidegui.thumbnails import ThumbnailStore
+from tasks.archiving import ArchiveSelection
 from tasks.db import DB
 from tasks.metamodel import MetaModel
 from tasks.taskmodel import TaskModel, WordExtractor
+from tasks.zipping import CompressionPolicy, COMPRESSIONS
 
 GUI = 'pyside2'
 LOGGING_ENABLED = False
+_SQLITE_PRAGMA_NAMES = {'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'busy_timeout'}
 
 if GUI == 'pyside2':
     from PySide2.QtGui import QIcon as Icon
@@ -80,8 +85,75 @@ class UserResourceMgr:
             config_data['tasks_root'] = root_dpath
         if 'file_commander_cmd' in yaml_data:
             config_data['file_commander_cmd'] = yaml_data['file_commander_cmd']
+        if 'task_search_mode' in yaml_data:
+            config_data['task_search_mode'] = yaml_data['task_search_mode']
+        if 'sqlite' in yaml_data:
+            config_data['sqlite_pragmas'] = self._read_sqlite_pragmas(yaml_data['sqlite'])
+        if 'watch_tasks_root' in yaml_data:
+            config_data['watch_tasks_root'] = yaml_data['watch_tasks_root']
+        if 'watch_interval' in yaml_data:
+            config_data['watch_interval'] = float(yaml_data['watch_interval'])
+        if 'zip_workers' in yaml_data:
+            config_data['zip_workers'] = int(yaml_data['zip_workers'])
+        if 'zip_policy' in yaml_data:
+            config_data['zip_policy'] = self._read_zip_policy(yaml_data['zip_policy'])
+        if 'thumbnail_cache_size' in yaml_data:
+            config_data['thumbnail_cache_size'] = int(yaml_data['thumbnail_cache_size'])
+        if 'archive' in yaml_data:
+            archive_data = dict(yaml_data['archive'])
+            if 'workers' in archive_data:
+                config_data['archive_workers'] = int(archive_data.pop('workers'))
+            config_data['archive_selection'] = self._read_archive_selection(archive_data)
         return Config(**config_data)
 
+    @staticmethod
+    def _read_sqlite_pragmas(yaml_data: Dict[str, Any]) -> Dict[str, Any]:
+        """ e.g. sqlite: {journal_mode: wal, synchronous: normal, cache_size: -16000, mmap_size: 268435456} """
+        pragmas = {}
+        for name, value in yaml_data.items():
+            if name not in _SQLITE_PRAGMA_NAMES:
+                raise Exception(f'config.yaml: unknown sqlite pragma "{name}"')
+            if not re.fullmatch(r'-?[0-9]+|[a-zA-Z]+', str(value)):
+                raise Exception(f'config.yaml: invalid value for sqlite pragma "{name}": {value}')
+            pragmas[name] = value
+        return pragmas
+
+    @staticmethod
+    def _read_zip_policy(yaml_data: Dict[str, Any]) -> CompressionPolicy:
+        """ e.g. zip_policy: {compression: deflated, level: 6, size_levels: [[1048576, 9]], stored_suffixes: [.jpg]}
+            (stored_suffixes replaces the default list)
+        """
+        policy = CompressionPolicy()
+        for name, value in yaml_data.items():
+            if name == 'compression':
+                if value not in COMPRESSIONS:
+                    raise Exception(f'config.yaml: unknown zip compression "{value}"')
+                policy.compression = COMPRESSIONS[value]
+            elif name == 'level':
+                policy.default_level = int(value)
+            elif name == 'size_levels':
+                policy.size_levels = sorted((int(max_size), int(level)) for max_size, level in value)
+            elif name == 'stored_suffixes':
+                policy.stored_suffixes = set(suffix.lower() for suffix in value)
+            else:
+                raise Exception(f'config.yaml: unknown zip_policy entry "{name}"')
+        return policy
+
+    @staticmethod
+    def _read_archive_selection(yaml_data: Dict[str, Any]) -> ArchiveSelection:
+        """ e.g. archive: {min_age_days: 365, min_size: 1000000, categories: [work], workers: 4} """
+        selection = ArchiveSelection()
+        for name, value in yaml_data.items():
+            if name == 'min_age_days':
+                selection.min_age_days = None if value is None else float(value)
+            elif name == 'min_size':
+                selection.min_size = None if value is None else int(value)
+            elif name == 'categories':
+                selection.categories = None if value is None else set(value)
+            else:
+                raise Exception(f'config.yaml: unknown archive entry "{name}"')
+        return selection
+
     def read_state(self) -> UserState:
         state_fpath = self._user_dpath / 'state.yaml'
         if state_fpath.exists():
@@ -126,14 +198,20 @@ class UserResourceMgr:
         if css_fpath.exists():
             return css_fpath.open('r', encoding='utf-8').read()
 
-    def get_contact_repo(self) -> Repository:
-        return Repository(self._user_dpath / 'contacts.sqlite')
+    def get_thumbnail_store(self, max_size: int) -> ThumbnailStore:
+        return ThumbnailStore(self._user_dpath / 'thumbnails', max_size)
+
+    def get_contact_repo(self, connection_pragmas: Optional[Dict[str, Any]] = None) -> Repository:
+        return Repository(self._user_dpath / 'contacts.sqlite', connection_pragmas=connection_pragmas)
 
-    def read_task_model(self, tasks_metamodel: MetaModel, tasks_root: Path) -> TaskModel:
+    def read_task_model(self, tasks_metamodel: MetaModel, tasks_root: Path, fulltext_enabled: bool = False,
+                        connection_pragmas: Optional[Dict[str, Any]] = None) -> TaskModel:
         sqlite3_path = self._user_dpath / 'tasks.sqlite'
-        db = DB(sqlite3_path, tasks_metamodel, logging_enabled=LOGGING_ENABLED)
+        db = DB(sqlite3_path, tasks_metamodel, logging_enabled=LOGGING_ENABLED,
+                connection_pragmas=connection_pragmas)
         word_extractor = WordExtractor(self._user_dpath / 'no-keywords.txt')
-        task_model = TaskModel(db, tasks_root=tasks_root, word_extractor=word_extractor)
+        task_model = TaskModel(db, tasks_root=tasks_root, word_extractor=word_extractor,
+                               fulltext_enabled=fulltext_enabled)
         task_model.read()
         return task_model
 
@@ -150,6 +228,15 @@ class Config:
     tasks_root: Path
     file_commander_cmd: str
     margin: int = 5
+    task_search_mode: str = 'words'  # 'words' or 'fulltext' (needs sqlite3 with FTS5)
+    sqlite_pragmas: Dict[str, Any] = field(default_factory=dict)  # applied to tasks.sqlite and contacts.sqlite
+    watch_tasks_root: str = 'off'  # 'off', 'auto' (inotify, if available) or 'polling'
+    watch_interval: float = 2.0  # seconds
+    zip_workers: int = 1  # > 1: files are compressed in a process pool
+    zip_policy: CompressionPolicy = field(default_factory=CompressionPolicy)
+    archive_selection: ArchiveSelection = field(default_factory=ArchiveSelection)  # for zipping stale tasks
+    archive_workers: int = 4
+    thumbnail_cache_size: int = 100 * 1024 * 1024  # bytes, of the image previews in <user-dir>/thumbnails
 
 
 def _read_icon(icon_fpath: Path) -> Icon:
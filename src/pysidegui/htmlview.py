@@ -15,91 +15,214 @@
 # You should have received a copy of the GNU General Public License
 # along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
 
+import base64
+import lzma
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Tuple, Optional
-from zipfile import ZipFile
+from typing import Tuple, Optional, Callable, BinaryIO, TypeVar
+from zipfile import BadZipFile
 
-from PySide2.QtCore import QEvent, QBuffer, QIODevice, QSize, Qt
-from PySide2.QtGui import QHelpEvent, QImage, QPixmap
+from PySide2.QtCore import QEvent, QBuffer, QIODevice, QSize, Qt, QPoint, Signal
+from PySide2.QtGui import QHelpEvent, QImage
 from PySide2.QtWidgets import QTextEdit, QToolTip
 
+from pysidegui.lrucache import LruCache
+from pysidegui.previews import read_head
+from pysidegui.thumbnails import ThumbnailStore
+from tasks.zipindex import ZipMember, open_zipped_file
+
+T = TypeVar('T')
+
+
+@dataclass(eq=False)
+class _TooltipRequest:
+    anchor: str
+    pos: QPoint
+    mtime: Optional[float]
+    zip_member: Optional[ZipMember]
+    future: Optional[Future] = None
+    canceled: bool = False
+
 
 class HtmlView(QTextEdit):
+    TOOLTIP_CACHE_MAX_SIZE = 32 * 1024 * 1024
+    TOOLTIP_CACHE_MAX_ENTRIES = 200
+    TOOLTIP_WORKERS = 2
+    THUMBNAIL_SIZE = QSize(600, 400)
+    tooltip_loaded = Signal(object, object)  # _TooltipRequest, tooltip
 
-    def __init__(self, parent):
+    def __init__(self, parent, thumbnail_store: Optional[ThumbnailStore] = None,
+                 find_zip_member: Optional[Callable[[Path, str], Optional[ZipMember]]] = None):
+        """ find_zip_member: (zip_fpath, member_name) -> indexed member or None, called in the GUI thread """
         super().__init__(parent)
         self.zoomIn(range=1)
         self.click_link_observers = []
         self.setMouseTracking(True)
-        self._tooltip_caches = {}  # path -> buf
+        self._tooltip_cache: LruCache[str, str] = LruCache(self.TOOLTIP_CACHE_MAX_SIZE, self.TOOLTIP_CACHE_MAX_ENTRIES)
+        self._thumbnail_store = thumbnail_store
+        self._find_zip_member = find_zip_member or (lambda zip_fpath, member_name: None)
+        # tooltips are created in worker threads, the methods called there must not touch the widget
+        self._tooltip_executor = ThreadPoolExecutor(max_workers=self.TOOLTIP_WORKERS, thread_name_prefix='tooltip')
+        self._tooltip_request: Optional[_TooltipRequest] = None
+        self.tooltip_loaded.connect(self.on_tooltip_loaded)
 
     def event(self, event: QEvent):
         if event.type() == QEvent.ToolTip:
             help_event: QHelpEvent = event
             anchor = self.anchorAt(help_event.pos())
             if anchor:
-                tooltip = self._get_tooltip(anchor)
-                # html = "<img src='G:/app-data/cc-pim/icons/finn.ico'>Hallo</img>"
-                QToolTip.showText(help_event.globalPos(), tooltip)
+                self._show_tooltip(anchor, help_event.globalPos())
             else:
+                self._cancel_tooltip_request()
                 QToolTip.hideText()
                 event.ignore()
             return True
+        elif event.type() == QEvent.Leave:
+            self._cancel_tooltip_request()
 
         return super().event(event)
 
-    def _get_tooltip(self, anchor: str) -> str:
-        if anchor not in self._tooltip_caches:
-            self._tooltip_caches[anchor] = self._create_tooltip(anchor)
-        return self._tooltip_caches[anchor]
+    def _show_tooltip(self, anchor: str, pos: QPoint) -> None:
+        """ shows the cached tooltip or a placeholder, until the tooltip is loaded """
+        request = self._tooltip_request
+        if request is not None and request.anchor == anchor:
+            return  # still loading
+        self._cancel_tooltip_request()
+        path = Path(anchor)
+        stat = self._stat(path)
+        mtime = stat.st_mtime if stat else None
+        tooltip = self._tooltip_cache.get(anchor, mtime)
+        if tooltip is not None:
+            QToolTip.showText(pos, tooltip)
+            return
+
+        zip_member = None
+        if stat and not path.exists():
+            zip_fpath, zipped_filename = self._split_zip_path(path)
+            zip_member = self._find_zip_member(zip_fpath, zipped_filename)
+        request = _TooltipRequest(anchor, pos, mtime, zip_member)
+        request.future = self._tooltip_executor.submit(self._load_tooltip, request)
+        self._tooltip_request = request
+        QToolTip.showText(pos, f'<p>{anchor}</p><p><i>loading ...</i></p>')
 
-    def _create_tooltip(self, anchor: str) -> str:
+    def _cancel_tooltip_request(self) -> None:
+        request = self._tooltip_request
+        if request is not None:
+            request.canceled = True
+            request.future.cancel()
+            self._tooltip_request = None
+
+    def _load_tooltip(self, request: _TooltipRequest) -> None:
+        """ runs in a worker thread """
+        if request.canceled:
+            return
+        try:
+            tooltip = self._create_tooltip(request.anchor, request.zip_member)
+        except Exception as e:
+            print(f'creating tooltip of {request.anchor} failed: {e}')
+            tooltip = f'<p>{request.anchor}</p>'
+        self.tooltip_loaded.emit(request, tooltip)
+
+    def on_tooltip_loaded(self, request: _TooltipRequest, tooltip: str) -> None:
+        self._tooltip_cache.put(request.anchor, tooltip, request.mtime)
+        if request is self._tooltip_request:
+            self._tooltip_request = None
+            QToolTip.showText(request.pos, tooltip)
+
+    def _stat(self, path: Path) -> Optional[os.stat_result]:
+        """ stat of the file or of the zip file containing it, None if it doesn't exist """
+        try:
+            return path.stat()
+        except OSError:
+            zip_fpath, _ = self._split_zip_path(path)
+            if zip_fpath:
+                try:
+                    return zip_fpath.stat()
+                except OSError:
+                    pass
+        return None
+
+    def _create_tooltip(self, anchor: str, zip_member: Optional[ZipMember] = None) -> str:
         path = Path(anchor)
         suffix = path.suffix
         if suffix in ('.txt', '.py', '.html', '.xml'):
-            data = self._read_file(path)
-            if data:
-                file_buf = data.decode('utf-8')
+            head = self._read_file_head(path, zip_member)
+            if head and head[0]:
+                data, truncated = head
+                file_buf = data.decode('utf-8', errors='replace')  # the head may end within a character
+                marker = '<p><i>... (truncated)</i></p>' if truncated else ''
                 if suffix == '.html':
-                    return file_buf
+                    return file_buf + marker
                 else:
-                    return f'<pre>{file_buf}</pre>'
+                    return f'<pre>{file_buf}</pre>{marker}'
         elif suffix in ('.png', '.jpg'):
-            image = self._read_image(path)
-            if image:
-                buffer = QBuffer()
-                buffer.open(QIODevice.WriteOnly)
-                pixmap = QPixmap.fromImage(image)
-                pixmap.save(buffer, "PNG")
-                data = bytes(buffer.data().toBase64()).decode()
+            png_data = self._get_thumbnail(path, zip_member)
+            if png_data:
+                data = base64.b64encode(png_data).decode()
                 return f'<img src="data:image/png;base64,{data}">'
 
         return f'<p>{anchor}</p>'
 
-    def _read_image(self, path: Path) -> Optional[QImage]:
-        data = self._read_file(path)
+    def _get_thumbnail(self, path: Path, zip_member: Optional[ZipMember] = None) -> Optional[bytes]:
+        """ -> PNG data, from the thumbnail store if possible """
+        stat = self._stat(path) if self._thumbnail_store else None
+        if stat:
+            png_data = self._thumbnail_store.get(path, stat.st_mtime_ns, stat.st_size)
+            if png_data:
+                return png_data
+        image = self._read_image(path, zip_member)
+        if image:
+            buffer = QBuffer()
+            buffer.open(QIODevice.WriteOnly)
+            image.save(buffer, "PNG")
+            png_data = bytes(buffer.data())
+            if stat:
+                try:
+                    self._thumbnail_store.put(path, stat.st_mtime_ns, stat.st_size, png_data)
+                except OSError as e:
+                    print(f'writing thumbnail of {path} failed: {e}')
+            return png_data
+
+    def _read_image(self, path: Path, zip_member: Optional[ZipMember] = None) -> Optional[QImage]:
+        data = self._read_file(path, zip_member)
         if data:
             image = QImage()
             image.loadFromData(data, path.suffix[1:])
-            max_size = QSize(600, 400)
+            max_size = self.THUMBNAIL_SIZE
             image_size = image.size()
             if image_size.width() > max_size.width() or image_size.height() > max_size.height():
                 image = image.scaled(max_size, Qt.AspectRatioMode.KeepAspectRatio)
             return image
 
-    def _read_file(self, path: Path) -> Optional[bytes]:
+    def _read_file(self, path: Path, zip_member: Optional[ZipMember] = None) -> Optional[bytes]:
+        return self._read_stream(path, zip_member, lambda stream: stream.read())
+
+    def _read_file_head(self, path: Path, zip_member: Optional[ZipMember] = None) -> Optional[Tuple[bytes, bool]]:
+        """ -> the first lines of the file, truncated """
+        return self._read_stream(path, zip_member, read_head)
+
+    def _read_stream(self, path: Path, zip_member: Optional[ZipMember], read_func: Callable[[BinaryIO], T]) \
+            -> Optional[T]:
+        """ a stale index entry of a zip member is retried with the central directory of the zip file """
         try:
-            if path.exists():
-                return path.open('rb').read()
-            else:
-                zip_fpath, zipped_filename = self._split_zip_path(path)
-                if zip_fpath:
-                    with ZipFile(zip_fpath, 'r') as zip_file:
-                        return zip_file.read(zipped_filename)
-        except OSError:
-            pass
-        except PermissionError:
-            pass
+            with self._open_file(path, zip_member) as stream:
+                return read_func(stream)
+        except (OSError, KeyError, BadZipFile, EOFError, zlib.error, lzma.LZMAError):
+            if zip_member is None:
+                return None
+        return self._read_stream(path, None, read_func)
+
+    def _open_file(self, path: Path, zip_member: Optional[ZipMember] = None) -> BinaryIO:
+        """ opens a file or a member of a zip file """
+        if path.exists():
+            return path.open('rb')
+        zip_fpath, zipped_filename = self._split_zip_path(path)
+        if zip_fpath is None:
+            raise FileNotFoundError(path)
+        return open_zipped_file(zip_fpath, zipped_filename, zip_member)
 
     @staticmethod
     def _split_zip_path(path: Path) -> Tuple[Optional[Path], Optional[str]]:
@@ -121,6 +244,16 @@ class HtmlView(QTextEdit):
             for observer in self.click_link_observers:
                 observer(href_str)
 
+    def mouseMoveEvent(self, event):
+        request = self._tooltip_request
+        if request is not None and self.anchorAt(event.pos()) != request.anchor:
+            self._cancel_tooltip_request()
+        super().mouseMoveEvent(event)
+
     def set_text(self, text: str) -> None:
-        self._tooltip_caches.clear()
         super().setText(text)
+
+    def shutdown(self) -> None:
+        """ cancels the loading of tooltips, the running ones are not waited for """
+        self._cancel_tooltip_request()
+        self._tooltip_executor.shutdown(wait=False, cancel_futures=True)
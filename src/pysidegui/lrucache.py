@@ -0,0 +1,90 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Generic, TypeVar, Callable, Optional, Hashable, Any
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+@dataclass
+class _Entry(Generic[V]):
+    value: V
+    stamp: Any
+    size: int
+
+
+class LruCache(Generic[K, V]):
+    """ least recently used cache, bounded by the total size of the values and the number of entries
+
+        Each value can have a stamp (e.g. the mtime of its file), get() with another stamp is a miss.
+        Doesn't depend on Qt.
+    """
+
+    def __init__(self, max_size: int, max_entries: int, size_of: Callable[[V], int] = sys.getsizeof):
+        self._max_size = max_size
+        self._max_entries = max_entries
+        self._size_of = size_of
+        self._entries: OrderedDict[K, _Entry[V]] = OrderedDict()
+        self._total_size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_size(self) -> int:
+        return self._total_size
+
+    def get(self, key: K, stamp: Any = None) -> Optional[V]:
+        entry = self._entries.get(key, None)
+        if entry is not None and entry.stamp != stamp:
+            self.remove(key)  # outdated
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def put(self, key: K, value: V, stamp: Any = None) -> None:
+        """ values bigger than the whole cache are not stored """
+        self.remove(key)
+        size = self._size_of(value)
+        if size > self._max_size:
+            return
+        self._entries[key] = _Entry(value, stamp, size)
+        self._total_size += size
+        while self._total_size > self._max_size or len(self._entries) > self._max_entries:
+            _, old_entry = self._entries.popitem(last=False)
+            self._total_size -= old_entry.size
+
+    def remove(self, key: K) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_size -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._total_size = 0
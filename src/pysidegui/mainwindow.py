@@ -17,10 +17,12 @@
 import re
 import webbrowser
 from datetime import datetime
-from typing import Optional, Iterator, List
+from pathlib import Path
+from typing import Optional, Iterator, List, Set, Tuple, Dict
 
-from PySide2.QtCore import Qt, QPoint
-from PySide2.QtWidgets import QListWidgetItem, QProgressDialog, QMenu
+from PySide2.QtCore import Qt, QPoint, QTimer
+from PySide2.QtGui import QCloseEvent
+from PySide2.QtWidgets import QListWidgetItem, QProgressDialog, QMenu, QMessageBox
 from PySide2.QtWidgets import QMainWindow
 
 from contacts.contactmodel import ContactModel
@@ -28,9 +30,15 @@ from context import Context
 from pysidegui._ui2_.ui_mainwindow import Ui_MainWindow, QResizeEvent, QMoveEvent, QBrush, QColor
 from pysidegui.contactsgui.contactsgui import ContactsGui
 from pysidegui.globalitemid import GlobalItemID
+from pysidegui.htmlview import HtmlView
 from pysidegui.modelgui import ResultItemData, ModelGui
 from pysidegui.tasksgui.tasksgui import TasksGui
-from tasks.caching import TaskCacheManager, TaskCache, TaskFilesState
+from pysidegui.worker import BackgroundCall, JobSignals
+from tasks.archiving import ArchiveJobQueue, ArchiveJob, ArchiveBatch
+from tasks.caching import TaskCacheManager, TaskCache, TaskFilesState, TaskResourceReader, ResourceStamp
+from tasks.taskmodel import read_changed_caches, read_refreshed_resources
+from tasks.watching import create_watcher, TasksRootWatcher
+from tasks.zipping import ArchiveCanceled
 
 
 class MainWindow(QMainWindow):
@@ -48,22 +56,43 @@ class MainWindow(QMainWindow):
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
 
-        self.ui.splitter.setStretchFactor(0, 0)
-        self.ui.splitter.setStretchFactor(1, 1)
-        self.resize(*self._state.frame_size)
-        self.move(*self._state.frame_pos)
-        self.ui.splitter.setSizes([self._state.search_width, self._state.frame_size[0] - self._state.search_width])
-
-        contact_repo = context.user.get_contact_repo()
+        contact_repo = context.user.get_contact_repo(connection_pragmas=self._config.sqlite_pragmas)
         contact_repo.reload()
         date_changes, fact_changes = contact_repo.aggregate_revisions()
         contact_model = ContactModel(date_changes, fact_changes)
 
         task_meta_model = context.system.read_task_metamodel()
-        self._task_model = context.user.read_task_model(task_meta_model, self._config.tasks_root)
-        self._task_model.update_cache_of_active_tasks()
+        self._task_model = context.user.read_task_model(
+            task_meta_model, self._config.tasks_root,
+            fulltext_enabled=self._config.task_search_mode == 'fulltext',
+            connection_pragmas=self._config.sqlite_pragmas)
+        self._html_view = HtmlView(self.ui.splitter,
+                                   thumbnail_store=context.user.get_thumbnail_store(self._config.thumbnail_cache_size),
+                                   find_zip_member=self._task_model.find_zip_member)
+        self.ui.splitter.addWidget(self._html_view)
+        self.ui.splitter.setStretchFactor(0, 0)
+        self.ui.splitter.setStretchFactor(1, 1)
+        self.resize(*self._state.frame_size)
+        self.move(*self._state.frame_pos)
+        self.ui.splitter.setSizes([self._state.search_width, self._state.frame_size[0] - self._state.search_width])
+        self._active_caches_call: Optional[BackgroundCall] = None
+        self._watcher: Optional[TasksRootWatcher] = None  # created in the background (see on_watcher_created())
+        self._watcher_call: Optional[BackgroundCall] = None
+        self._archive_count = 0  # number of finished archive jobs and batches
+        self._watcher_archive_count = 0  # when the watcher call was started
+        self._pending_resource_paths: Optional[Set[Path]] = set()  # to be read with the next poll, None: all
+        self._watcher_timer = QTimer(self)
+        self._is_closed = False
         self._contacts_gui = ContactsGui(contact_model, contact_repo)
-        self._tasks_gui = TasksGui(self._task_model)
+        self._archive_signals = JobSignals(self)
+        self._archive_signals.progress.connect(self.on_archive_progress)
+        self._archive_signals.finished.connect(self.on_archive_finished)
+        self._archive_queue = ArchiveJobQueue(on_progress=self._archive_signals.progress.emit,
+                                              on_finished=self._archive_signals.finished.emit)
+        self._archive_batch: Optional[ArchiveBatch] = None
+        self._archive_batch_call: Optional[BackgroundCall] = None
+        self._tasks_gui = TasksGui(self._task_model, self._archive_queue, zip_workers=self._config.zip_workers,
+                                   zip_policy=self._config.zip_policy)
 
         self._cur_model_gui: ModelGui = self._contacts_gui
         self._show_obj_id = None
@@ -79,7 +108,7 @@ class MainWindow(QMainWindow):
         self.ui.search_result_list.setContextMenuPolicy(Qt.CustomContextMenu)
         self.ui.search_result_list.customContextMenuRequested.connect(self.on_list_item_context_menu)
         if self._contact_css:
-            self.ui.html_view.document().setDefaultStyleSheet(self._contact_css)
+            self._html_view.document().setDefaultStyleSheet(self._contact_css)
 
         self.ui.action_contacts.triggered.connect(self.on_contacts_mode)
         self.ui.action_tasks.triggered.connect(self.on_tasks_mode)
@@ -91,13 +120,121 @@ class MainWindow(QMainWindow):
         self.ui.action_save_all.triggered.connect(self.on_save_all)
         self.ui.action_revert_changes.triggered.connect(self.on_revert_changed)
         self.ui.action_update_cache.triggered.connect(self.on_update_cache)
+        self.ui.action_archive_tasks.triggered.connect(self.on_archive_tasks)
         self.ui.splitter.splitterMoved.connect(self.on_splitter_moved)
         self.ui.search_edit.textChanged.connect(self.on_search_text_changed)
         self.ui.category_filter.currentIndexChanged.connect(self.on_category_changed)
         self.ui.files_state_filter.currentIndexChanged.connect(self.on_files_state_changed)
         self.ui.search_result_list.currentItemChanged.connect(self.on_cur_list_item_changed)
         self.ui.search_result_list.itemActivated.connect(self.on_list_item_activated)
-        self.ui.html_view.click_link_observers.append(self.on_html_view_click_link)
+        self._html_view.click_link_observers.append(self.on_html_view_click_link)
+
+        QTimer.singleShot(0, self._start_update_of_active_caches)
+        # adding the inotify watches or taking the first polling snapshot walks the tasks root
+        self._watcher_call = BackgroundCall(create_watcher, self._config.tasks_root, self._config.watch_tasks_root)
+        self._watcher_call.finished.connect(self.on_watcher_created)
+        self._watcher_call.failed.connect(self.on_watcher_failed)
+        self._watcher_call.start()
+
+    def on_watcher_created(self, watcher: Optional[TasksRootWatcher]) -> None:
+        self._watcher_call = None
+        if watcher is None:
+            return
+        if self._is_closed:
+            watcher.close()
+            return
+        self._watcher = watcher
+        self._watcher_timer.timeout.connect(self.on_watcher_timer)
+        self._watcher_timer.start(int(self._config.watch_interval * 1000))
+
+    def _start_update_of_active_caches(self) -> None:
+        print('update caches of active tasks (background)...')
+        task_dirs, old_stamps = self._task_model.get_active_task_dirs()
+        self._active_caches_call = BackgroundCall(read_changed_caches, task_dirs, old_stamps)
+        self._active_caches_call.finished.connect(self.on_active_caches_read)
+        self._active_caches_call.failed.connect(self.on_active_caches_failed)
+        self._active_caches_call.start()
+
+    def on_active_caches_read(self, changed_caches: List[TaskCache]) -> None:
+        self._active_caches_call = None
+        updated_serials = self._task_model.update_active_task_caches(changed_caches)
+        print(f'ready ({len(updated_serials)} caches of active tasks updated)')
+        if updated_serials and self._cur_model_gui is self._tasks_gui:
+            self._update_list()
+
+    def on_active_caches_failed(self, error: Exception) -> None:
+        self._active_caches_call = None
+        print(f'update of active caches failed: {error}')
+
+    def on_archive_progress(self, job: ArchiveJob, done_size: int, total_size: int) -> None:
+        percent = done_size * 100 // total_size if total_size else 100
+        queued_count = len(self._archive_queue.get_jobs()) - 1
+        message = f'{job.action.value} {job.source_path.name}: {percent}%'
+        if queued_count > 0:
+            message += f' ({queued_count} more queued)'
+        self.statusBar().showMessage(message)
+
+    def on_archive_finished(self, job: ArchiveJob, error: Optional[Exception]) -> None:
+        if isinstance(error, ArchiveCanceled):
+            self.statusBar().showMessage(f'{job.action.value} {job.source_path.name}: canceled', 5000)
+        elif error is not None:
+            print(f'{job.action.value} {job.source_path} failed: {error}')
+            self.statusBar().showMessage(f'{job.action.value} {job.source_path.name} failed: {error}')
+        else:
+            self.statusBar().showMessage(f'{job.action.value} {job.source_path.name}: ready', 5000)
+        self._archive_count += 1
+        self._tasks_gui.finish_archive_job(job)
+        if self._cur_model_gui is self._tasks_gui:
+            self._update_list()
+
+    def closeEvent(self, close_event: QCloseEvent) -> None:
+        # removes partial archives
+        self._archive_queue.cancel_all()
+        if self._archive_batch_call is not None:
+            self._archive_batch.cancel()
+            self._archive_batch_call.wait()
+        self._archive_queue.wait()
+        self._is_closed = True
+        self._watcher_timer.stop()
+        for call in (self._watcher_call, self._active_caches_call):
+            if call is not None:
+                call.wait()
+        if self._watcher is not None:
+            self._watcher.close()
+        self._html_view.shutdown()
+        super().closeEvent(close_event)
+
+    def on_watcher_timer(self) -> None:
+        if self._watcher_call is not None or self._active_caches_call is not None:
+            return
+        if self._archive_queue.get_jobs() or self._archive_batch_call is not None:
+            return  # the events are kept, so half-written zip files and half-removed dirs are not read
+        # polling and reading the resources walk the file system, so it's done in a worker thread
+        self._watcher_call = BackgroundCall(_read_watched_resources, self._watcher, self._pending_resource_paths,
+                                            self._config.tasks_root, self._task_model.get_resource_stamps())
+        self._watcher_call.finished.connect(self.on_watcher_polled)
+        self._watcher_call.failed.connect(self.on_watcher_failed)
+        self._pending_resource_paths = set()
+        self._watcher_archive_count = self._archive_count
+        self._watcher_call.start()
+
+    def on_watcher_polled(self, result: Tuple[Optional[Set[Path]], List[TaskCache], Set[Path]]) -> None:
+        self._watcher_call = None
+        resource_paths, changed_caches, missing_paths = result
+        if self._archive_count != self._watcher_archive_count:
+            # an archive job has finished meanwhile => the result may be outdated, the paths are read again
+            if resource_paths is None or self._pending_resource_paths is None:
+                self._pending_resource_paths = None
+            else:
+                self._pending_resource_paths |= resource_paths
+            return
+        changed_serials = self._task_model.apply_refreshed_resources(changed_caches, missing_paths)
+        if changed_serials and self._cur_model_gui is self._tasks_gui:
+            self._update_list()
+
+    def on_watcher_failed(self, error: Exception) -> None:
+        self._watcher_call = None
+        print(f'watching the tasks root failed: {error}')
 
     def _update_category_filter(self) -> None:
         self.ui.category_filter.clear()
@@ -146,7 +283,7 @@ class MainWindow(QMainWindow):
         self.ui.search_result_list.setCurrentItem(None)
         self._update_list()
         if self._contact_css:
-            self.ui.html_view.document().setDefaultStyleSheet(self._contact_css)
+            self._html_view.document().setDefaultStyleSheet(self._contact_css)
         self._cur_css = self._contact_css
 
     def on_tasks_mode(self):
@@ -158,7 +295,7 @@ class MainWindow(QMainWindow):
         self.ui.search_result_list.setCurrentItem(None)
         self._update_list()
         if self._task_css:
-            self.ui.html_view.document().setDefaultStyleSheet(self._task_css)
+            self._html_view.document().setDefaultStyleSheet(self._task_css)
         self._cur_css = self._task_css
 
     def on_new_item(self):
@@ -239,23 +376,75 @@ class MainWindow(QMainWindow):
         t0 = datetime.now()
         cache_mgr = TaskCacheManager(self._config.tasks_root)
         task_resources = cache_mgr.read_resources()
+        old_stamps = self._task_model.get_resource_stamps()
 
-        task_caches: List[TaskCache] = []
+        changed_caches: List[TaskCache] = []
         n = len(task_resources)
         dlg = QProgressDialog("updating...", "Abort", 0, n)
         dlg.setWindowTitle("Cache")
         dlg.setWindowModality(Qt.WindowModal)
-        for i in range(n):
-            task_caches.append(task_resources[i].read())
+        reader = TaskResourceReader()
+        for i, task_cache in enumerate(reader.iter_read_changed(task_resources, old_stamps)):
+            if task_cache is not None:
+                changed_caches.append(task_cache)
 
             dlg.setValue(i)
             if dlg.wasCanceled():
+                reader.cancel()
                 return
 
-        self._task_model.update_cache(t0, task_caches)
+        found_paths = set(task_resource.path for task_resource in task_resources)
+        self._task_model.update_cache_incremental(t0, changed_caches, found_paths)
         dlg.setValue(n)
         self._update_list()
 
+    def on_archive_tasks(self):
+        if self._archive_batch_call is not None:
+            return
+        tasks = [task for task in self._task_model.select_tasks_to_archive(self._config.archive_selection)
+                 if self._archive_queue.get_job(task.serial) is None]
+        if not tasks:
+            self.statusBar().showMessage('no tasks to archive', 5000)
+            return
+        total_size = sum(task.cache.stamp.size for task in tasks)
+        answer = QMessageBox.question(self, 'Archive', f'zip {len(tasks)} tasks ({total_size / 1024 / 1024:.1f} MiB)?')
+        if answer != QMessageBox.Yes:
+            return
+
+        batch = self._task_model.create_archive_batch(tasks, max_workers=self._config.archive_workers,
+                                                      policy=self._config.zip_policy)
+        if not self._archive_queue.register(batch.jobs):  # the queue refuses further jobs for these tasks
+            return
+        self._tasks_gui.set_archive_batch_running(True)
+        dlg = QProgressDialog("archiving...", "Abort", 0, len(tasks), self)
+        dlg.setWindowTitle("Archive")
+        dlg.canceled.connect(batch.cancel)
+        self._archive_batch = batch
+        signals = JobSignals(dlg)
+        signals.progress.connect(lambda _, done_count, __: dlg.setValue(done_count))
+        self._archive_batch_call = BackgroundCall(
+            batch.run, progress=lambda done_count, count: signals.progress.emit(batch, done_count, count))
+        self._archive_batch_call.finished.connect(lambda _: self.on_archive_batch_finished(batch, dlg))
+        self._archive_batch_call.failed.connect(lambda _: self.on_archive_batch_finished(batch, dlg))
+        self._archive_batch_call.start()
+
+    def on_archive_batch_finished(self, batch: ArchiveBatch, dlg: QProgressDialog) -> None:
+        self._archive_batch = None
+        self._archive_batch_call = None
+        self._archive_queue.unregister(batch.jobs)
+        self._archive_count += 1
+        self._tasks_gui.set_archive_batch_running(False)
+        dlg.close()
+        zipped_serials = self._task_model.finish_archive_batch(batch)
+        canceled_count = sum(1 for error in batch.errors.values() if isinstance(error, ArchiveCanceled))
+        for task_serial, error in batch.errors.items():
+            if not isinstance(error, ArchiveCanceled):
+                print(f'zipping task {task_serial} failed: {error}')
+        self.statusBar().showMessage(f'{len(zipped_serials)} tasks zipped, {canceled_count} canceled, '
+                                     f'{len(batch.errors) - canceled_count} failed')
+        if self._cur_model_gui is self._tasks_gui:
+            self._update_list()
+
     def _update_toolbar_icons(self):
         exists_uncommitted_changes = self._cur_model_gui.exists_uncommitted_changes()
         self.ui.action_save_all.setEnabled(exists_uncommitted_changes)
@@ -322,7 +511,7 @@ class MainWindow(QMainWindow):
             html_text = self._cur_model_gui.get_html_text(obj_id, search_rex)
         else:
             html_text = ''
-        self.ui.html_view.set_text(html_text)
+        self._html_view.set_text(html_text)
 
     def _create_search_rex(self) -> Optional[re.Pattern]:
         search_text = self.ui.search_edit.text()
@@ -330,3 +519,18 @@ class MainWindow(QMainWindow):
             search_words = [x.strip() for x in search_text.split() if x.strip() != '']
             return re.compile('|'.join(search_words),
                               flags=re.I)  # todo: should only find matches which begins with search words
+
+
+def _read_watched_resources(watcher: TasksRootWatcher, pending_paths: Optional[Set[Path]], tasks_root: Path,
+                            old_stamps: Dict[Path, ResourceStamp]
+                            ) -> Tuple[Optional[Set[Path]], List[TaskCache], Set[Path]]:
+    """ runs in a worker thread, returns the resource paths (None: all), changed caches and missing paths """
+    resource_paths = watcher.poll()  # None: the events were lost => all resources are checked
+    if resource_paths is None or pending_paths is None:
+        resource_paths = None
+    else:
+        resource_paths = resource_paths | pending_paths
+    if resource_paths is not None and not resource_paths:
+        return resource_paths, [], set()
+    changed_caches, missing_paths = read_refreshed_resources(tasks_root, resource_paths, old_stamps)
+    return resource_paths, changed_caches, missing_paths
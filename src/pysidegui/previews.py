@@ -0,0 +1,47 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+from typing import BinaryIO, Tuple
+
+PREVIEW_MAX_SIZE = 64 * 1024
+PREVIEW_MAX_LINES = 500
+
+
+def read_head(stream: BinaryIO, max_size: int = PREVIEW_MAX_SIZE,
+              max_lines: int = PREVIEW_MAX_LINES) -> Tuple[bytes, bool]:
+    """ reads at most max_size bytes and max_lines lines, so previews of big files cost the same as small ones
+
+        -> data, truncated
+        If the data is truncated, it ends with a complete line (if it contains a line break).
+    """
+    data = stream.read(max_size + 1)
+    truncated = len(data) > max_size
+    if truncated:
+        data = data[:max_size]
+        line_end = data.rfind(b'\n')
+        if line_end >= 0:
+            data = data[:line_end + 1]
+    line_end = -1
+    for _ in range(max_lines):
+        line_end = data.find(b'\n', line_end + 1)
+        if line_end < 0:
+            break
+    else:
+        if line_end + 1 < len(data):
+            data = data[:line_end + 1]
+            truncated = True
+    return data, truncated
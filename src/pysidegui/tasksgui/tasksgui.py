@@ -24,19 +24,31 @@ from PySide2.QtGui import QIcon
 from PySide2.QtWidgets import QMainWindow
 
 from pysidegui.globalitemid import GlobalItemID, GlobalItemTypes
+from pysidegui.lrucache import LruCache
 from pysidegui.modelgui import ModelGui, ResultItemData
 from pysidegui.tasksgui.taskeditdialog import TaskEditDialog
+from tasks.archiving import ArchiveJobQueue, ArchiveJob, ArchiveAction
 from tasks.caching import TaskFilesState, TaskCacheManager, TaskCache
 from tasks.html_creator import write_htmlstr, LinkSolver
 from tasks.page import Header, NormalText, Paragraph, List, ListItem, Link, Page
 from tasks.taskmodel import TaskModel, Task
+from tasks.zipping import CompressionPolicy
 
 
 class TasksGui(ModelGui):
     _REX = re.compile(r"(?P<type>[a-zA-Z]+)(?P<serial>[0-9]+)")
+    RENDER_CACHE_MAX_SIZE = 16 * 1024 * 1024
+    RENDER_CACHE_MAX_ENTRIES = 100
 
-    def __init__(self, task_model: TaskModel):
+    def __init__(self, task_model: TaskModel, archive_queue: ArchiveJobQueue, zip_workers: int = 1,
+                 zip_policy: Optional[CompressionPolicy] = None):
         self._task_model = task_model
+        self._archive_queue = archive_queue
+        self._zip_workers = zip_workers
+        self._zip_policy = zip_policy
+        self._is_archive_batch_running = False
+        # (task serial, last rev_no, cache version, search pattern) -> html text, outdated keys are evicted by age
+        self._render_cache: LruCache[tuple, str] = LruCache(self.RENDER_CACHE_MAX_SIZE, self.RENDER_CACHE_MAX_ENTRIES)
         # keywords = self._task_model.calc_keywords()
         # self.ui.title_edit.init_completer(keywords)  # todo?
 
@@ -48,6 +60,7 @@ class TasksGui(ModelGui):
             dlg_values = dlg.get_values()  # { attr-name -> new-value }
             new_task_rev = new_task.create_new_revision(**dlg_values)
             self._task_model.add_task_revision(new_task_rev)
+            self._render_cache.clear()  # links of other tasks show the header
             return _convert_task2global_id(new_task_rev.task_serial)
 
     def edit_item(self, glob_item_id: GlobalItemID, frame: QMainWindow, data_icons: Dict[str, QIcon],
@@ -65,6 +78,7 @@ class TasksGui(ModelGui):
 
         new_task_rev = task.create_new_revision(**dlg_values)
         self._task_model.add_task_revision(new_task_rev)
+        self._render_cache.clear()  # links of other tasks show the header
         return True
 
     def save_all(self) -> bool:
@@ -77,12 +91,17 @@ class TasksGui(ModelGui):
                       search_rex: Optional[re.Pattern] = None) -> str:
         task_serial = _convert_global2task_serial(glob_item_id)
         task = self._task_model.get_task(task_serial)
-        title = task.get_header()
-        page = copy.deepcopy(task.last_revision.page)
-        self._extend_page_with_task_cache(page=page, task=task)
-        link_solver = LinkSolver(self._task_model)
-        html_text = write_htmlstr(title, page, link_solver=link_solver,
-                                  search_rex=search_rex)
+        search_key = (search_rex.pattern, search_rex.flags) if search_rex else None
+        render_key = (task_serial, task.last_revision.rev_no, task.cache_version, search_key)
+        html_text = self._render_cache.get(render_key)
+        if html_text is None:
+            title = task.get_header()
+            page = copy.deepcopy(task.last_revision.page)
+            self._extend_page_with_task_cache(page=page, task=task)
+            link_solver = LinkSolver(self._task_model)
+            html_text = write_htmlstr(title, page, link_solver=link_solver,
+                                      search_rex=search_rex)
+            self._render_cache.put(render_key, html_text)
         return html_text
 
     def _extend_page_with_task_cache(self, page: Page, task: Task) -> None:
@@ -127,35 +146,51 @@ class TasksGui(ModelGui):
     def iter_sorted_filtered_items(self, search_words: Iterable[str],
                                    filter_category: str,
                                    filter_files_state: str) -> Iterator[ResultItemData]:
-        yield from sorted(
-            self._iter_filtered_items(
-                search_words, filter_category, filter_files_state),
-            key=lambda x: x.title, reverse=True)
+        search_words = list(search_words)
+        if search_words and self._task_model.fulltext_enabled:
+            # already sorted by rank
+            yield from self._iter_filtered_items(search_words, filter_category, filter_files_state)
+        else:
+            yield from sorted(
+                self._iter_filtered_items(
+                    search_words, filter_category, filter_files_state),
+                key=lambda x: x.title, reverse=True)
 
     def _iter_filtered_items(self, search_words: Iterable[str],
                              filter_category: str,
                              filter_files_state: str) -> Iterator[ResultItemData]:
-        for task in self._task_model.tasks:
-            if task.does_meet_the_criteria(search_words, filter_category, filter_files_state):
-                yield ResultItemData(
-                    glob_id=_convert_task2global_id(task.serial),
-                    category=task.last_revision.category,
-                    title=task.get_header(),
-                    rgb=task.get_rgb(),
-                )
+        if self._task_model.fulltext_enabled:
+            tasks = self._task_model.iter_ranked_tasks(search_words, filter_category, filter_files_state)
+        else:
+            tasks = self._task_model.iter_filtered_tasks(search_words, filter_category, filter_files_state)
+        for task in tasks:
+            yield ResultItemData(
+                glob_id=_convert_task2global_id(task.serial),
+                category=task.last_revision.category,
+                title=task.get_header(),
+                rgb=task.get_rgb(),
+            )
 
     def iter_categories(self) -> Iterator[str]:
         yield from self._task_model.get_sorted_categories()
 
+    def set_archive_batch_running(self, is_running: bool) -> None:
+        """ while a batch runs, no tasks are zipped or unzipped from the context menu """
+        self._is_archive_batch_running = is_running
+
     def iter_context_menu_items(self, glob_item_id: GlobalItemID) -> Iterator[str]:
         task_serial = _convert_global2task_serial(glob_item_id)
         task = self._task_model.get_task(task_serial)
-        if task.cache:
+        if self._archive_queue.get_job(task_serial) is not None:
+            yield 'cancel-archiving'
+        elif task.cache:
             files_state = task.cache.files_state
             if files_state in [TaskFilesState.ACTIVE, TaskFilesState.PASSIVE]:
                 yield 'open-in-explorer'
 
-            if files_state == TaskFilesState.ACTIVE:
+            if self._is_archive_batch_running:
+                pass
+            elif files_state == TaskFilesState.ACTIVE:
                 yield 'zip'
             elif files_state == TaskFilesState.PASSIVE:
                 yield 'unzip'
@@ -178,11 +213,16 @@ class TasksGui(ModelGui):
             task.create_dir(tasks_root)
             self._add_files_state(task)
         elif action_name == 'zip':
-            task.zip_dir(tasks_root)
-            self._update_files_state(task)
+            self._archive_queue.submit(ArchiveJob(task_serial, ArchiveAction.ZIP, task.get_path(tasks_root),
+                                                  max_workers=self._zip_workers, policy=self._zip_policy))
         elif action_name == 'unzip':
-            task.unzip_file(tasks_root)
-            self._update_files_state(task)
+            self._archive_queue.submit(ArchiveJob(task_serial, ArchiveAction.UNZIP, task.get_path(tasks_root)))
+        elif action_name == 'cancel-archiving':
+            self._archive_queue.cancel(task_serial)
+
+    def finish_archive_job(self, job: ArchiveJob) -> None:
+        """ called in the GUI thread, after the job has changed the files """
+        self._task_model.refresh_resources([job.source_path, job.target_path])
 
     def _add_files_state(self, task: Task) -> None:
         task_cache = TaskCache(
@@ -197,12 +237,6 @@ class TasksGui(ModelGui):
         cache_mgr = TaskCacheManager(self._task_model.tasks_root)
         cache_mgr.insert_one_cache_to_db(task_cache=task_cache, db=self._task_model.db)
 
-    def _update_files_state(self, task: Task) -> None:
-        cache_mgr = TaskCacheManager(self._task_model.tasks_root)
-        cache_mgr.update_state_files_in_db(task.serial,
-                                           task.cache.files_state,
-                                           db=self._task_model.db)
-
 
 class FilebufSplitter:
 
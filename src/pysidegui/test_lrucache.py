@@ -0,0 +1,56 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from pysidegui.lrucache import LruCache
+
+
+class TestLruCache(unittest.TestCase):
+
+    def test_max_entries(self):
+        cache = LruCache(max_size=1000, max_entries=2, size_of=len)
+        cache.put('a', 'aa')
+        cache.put('b', 'bb')
+        self.assertEqual(cache.get('a'), 'aa')  # => b is the least recently used one
+        cache.put('c', 'cc')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'cc')
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertEqual(cache.total_size, 4)
+
+    def test_max_size(self):
+        cache = LruCache(max_size=10, max_entries=100, size_of=len)
+        for key in 'abcd':
+            cache.put(key, key * 4)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.total_size, 8)
+        cache.put('e', 'e' * 11)  # too big
+        self.assertIsNone(cache.get('e'))
+        self.assertEqual(cache.get('d'), 'dddd')
+
+    def test_stamp(self):
+        cache = LruCache(max_size=100, max_entries=10, size_of=len)
+        cache.put('a', 'old', stamp=1.0)
+        self.assertEqual(cache.get('a', stamp=1.0), 'old')
+        self.assertIsNone(cache.get('a', stamp=2.0))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.total_size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
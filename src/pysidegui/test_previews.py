@@ -0,0 +1,47 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import unittest
+
+from pysidegui.previews import read_head
+
+
+class TestReadHead(unittest.TestCase):
+
+    def test_small(self):
+        self.assertEqual(read_head(io.BytesIO(b'a\nb\n'), max_size=10, max_lines=2), (b'a\nb\n', False))
+        self.assertEqual(read_head(io.BytesIO(b'a\nb'), max_size=10, max_lines=2), (b'a\nb', False))
+        self.assertEqual(read_head(io.BytesIO(b''), max_size=10, max_lines=2), (b'', False))
+
+    def test_max_size(self):
+        self.assertEqual(read_head(io.BytesIO(b'aaa\nbbb\nccc\n'), max_size=10, max_lines=10), (b'aaa\nbbb\n', True))
+        self.assertEqual(read_head(io.BytesIO(b'a' * 20), max_size=10, max_lines=10), (b'a' * 10, True))
+
+    def test_max_lines(self):
+        self.assertEqual(read_head(io.BytesIO(b'a\nb\nc\n'), max_size=100, max_lines=2), (b'a\nb\n', True))
+        self.assertEqual(read_head(io.BytesIO(b'a\nb\nc'), max_size=100, max_lines=2), (b'a\nb\n', True))
+
+    def test_big_stream(self):
+        stream = io.BytesIO(b'line\n' * 1000000)
+        data, truncated = read_head(stream, max_size=1000, max_lines=100)
+        self.assertEqual((len(data), truncated), (500, True))
+        self.assertEqual(stream.tell(), 1001)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from pysidegui.thumbnails import ThumbnailStore
+
+
+class TestThumbnailStore(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._dpath = Path(self._temp_dir.name) / 'thumbnails'
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_get_put(self):
+        store = ThumbnailStore(self._dpath, max_size=1000)
+        path = Path('/tasks/work/200101-task/photo.jpg')
+        self.assertIsNone(store.get(path, 1, 100))
+        store.put(path, 1, 100, b'thumbnail')
+        self.assertEqual(store.get(path, 1, 100), b'thumbnail')
+        self.assertIsNone(store.get(path, 2, 100))  # changed file
+        self.assertIsNone(store.get(path, 1, 101))
+        self.assertEqual(ThumbnailStore(self._dpath, max_size=1000).get(path, 1, 100), b'thumbnail')
+
+    def test_evict(self):
+        store = ThumbnailStore(self._dpath, max_size=1000)
+        for i in range(3):
+            store.put(Path(f'{i}.png'), 1, 1, b'x' * 300)
+            time.sleep(0.02)  # the eviction order depends on the mtimes
+        store.put(Path('0.png'), 1, 1, b'x' * 300)  # replaced => still 900 bytes
+        time.sleep(0.02)
+        self.assertIsNotNone(store.get(Path('1.png'), 1, 1))
+        time.sleep(0.02)
+        # exceeds max_size => the least recently used ones are removed until 800 bytes are left
+        store.put(Path('3.png'), 1, 1, b'x' * 300)
+        self.assertEqual([store.get(Path(f'{i}.png'), 1, 1) is not None for i in range(4)],
+                         [False, True, False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+class ThumbnailStore:
+    """ thumbnails (PNG data) in a directory, keyed by path, mtime and size of the original file
+
+        When the total size exceeds max_size, the least recently used thumbnails are removed.
+        Thumbnails of changed files are not found any more and are removed the same way.
+        Doesn't depend on Qt, get() and put() can be called from worker threads.
+    """
+    SUFFIX = '.png'
+    EVICT_RATIO = 0.8  # after eviction the thumbnails take at most max_size * EVICT_RATIO
+
+    def __init__(self, dpath: Path, max_size: int):
+        self._dpath = dpath
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._total_size: Optional[int] = None  # read on first put()
+
+    def get(self, path: Path, mtime_ns: int, size: int) -> Optional[bytes]:
+        fpath = self._get_fpath(path, mtime_ns, size)
+        try:
+            data = fpath.read_bytes()
+            os.utime(fpath)  # last access for eviction
+        except OSError:
+            return None
+        return data
+
+    def put(self, path: Path, mtime_ns: int, size: int, data: bytes) -> None:
+        fpath = self._get_fpath(path, mtime_ns, size)
+        self._dpath.mkdir(parents=True, exist_ok=True)
+        fd, temp_fpath = tempfile.mkstemp(suffix='.tmp', dir=self._dpath)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            with self._lock:
+                try:
+                    replaced_size = fpath.stat().st_size  # e.g. written by another worker in the meantime
+                except OSError:
+                    replaced_size = 0
+                os.replace(temp_fpath, fpath)
+                if self._total_size is None:
+                    self._total_size = sum(size for _, size, _ in self._iter_thumbnails())
+                else:
+                    self._total_size += len(data) - replaced_size
+                if self._total_size > self._max_size:
+                    self._evict()
+        except BaseException:
+            Path(temp_fpath).unlink(missing_ok=True)
+            raise
+
+    def _get_fpath(self, path: Path, mtime_ns: int, size: int) -> Path:
+        key = hashlib.sha1(f'{path}|{mtime_ns}|{size}'.encode('utf-8')).hexdigest()
+        return self._dpath / (key + self.SUFFIX)
+
+    def _iter_thumbnails(self):
+        """ -> (fpath, size, mtime) """
+        with os.scandir(self._dpath) as entries:
+            for entry in entries:
+                if entry.name.endswith(self.SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    yield Path(entry.path), stat.st_size, stat.st_mtime
+
+    def _evict(self) -> None:
+        thumbnails = sorted(self._iter_thumbnails(), key=lambda thumbnail: thumbnail[2])
+        total_size = sum(size for _, size, _ in thumbnails)
+        max_size = self._max_size * self.EVICT_RATIO
+        for fpath, size, _ in thumbnails:
+            if total_size <= max_size:
+                break
+            try:
+                fpath.unlink()
+            except OSError:
+                continue
+            total_size -= size
+        self._total_size = total_size
@@ -0,0 +1,56 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+import threading
+from typing import Callable, Any
+
+from PySide2.QtCore import QObject, Signal
+
+
+class BackgroundCall(QObject):
+    """ calls a function in a worker thread and emits the result in the GUI thread
+
+        The function must not touch Qt widgets or the models, only its arguments.
+    """
+    finished = Signal(object)
+    failed = Signal(object)
+
+    def __init__(self, func: Callable[..., Any], *args, **kwargs):
+        super().__init__(None)
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def wait(self) -> None:
+        self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            result = self._func(*self._args, **self._kwargs)
+        except Exception as e:
+            self.failed.emit(e)
+        else:
+            self.finished.emit(result)
+
+
+class JobSignals(QObject):
+    """ passes the callbacks of a job queue (called in its worker thread) to the GUI thread """
+    progress = Signal(object, object, object)  # job, done size, total size (may exceed the int range of Qt)
+    finished = Signal(object, object)  # job, exception or None
@@ -0,0 +1,215 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import queue
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Optional, Callable, Dict, List, Set
+
+from tasks.caching import TaskCache, TaskZipFile
+from tasks.zipping import Zipper, Unzipper, CompressionPolicy, ProgressCallback, ArchiveCanceled
+
+TaskSerial = int
+
+
+class ArchiveAction(Enum):
+    ZIP = 'zip'
+    UNZIP = 'unzip'
+
+
+class ArchiveJob:
+    """ zips a task dir (and removes it) or unzips a task zip file (and removes it)
+
+        Changes only the file system, the task model must be updated afterwards
+        (e.g. by TaskModel.refresh_resources([job.source_path, job.target_path])).
+    """
+
+    def __init__(self, task_serial: TaskSerial, action: ArchiveAction, source_path: Path,
+                 max_workers: int = 1, policy: Optional[CompressionPolicy] = None):
+        self.task_serial = task_serial
+        self.action = action
+        self.source_path = source_path
+        self._max_workers = max_workers
+        self._policy = policy
+        self._cancel_event = threading.Event()
+
+    @property
+    def target_path(self) -> Path:
+        if self.action == ArchiveAction.ZIP:
+            return Path(str(self.source_path) + '.zip')
+        else:
+            return self.source_path.parent / self.source_path.stem
+
+    @property
+    def is_canceled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+    def run(self, progress: Optional[ProgressCallback] = None) -> None:
+        """ raises ArchiveCanceled, if the job was canceled before the archive was complete """
+        if self.is_canceled:
+            raise ArchiveCanceled()
+        if self.action == ArchiveAction.ZIP:
+            zipper = Zipper(self.source_path, max_workers=self._max_workers, policy=self._policy)
+            zipper.start(progress=progress, cancel_event=self._cancel_event)
+            shutil.rmtree(self.source_path)
+        else:
+            unzipper = Unzipper(self.source_path)
+            unzipper.start(progress=progress, cancel_event=self._cancel_event)
+            self.source_path.unlink()
+
+
+JobProgressCallback = Callable[[ArchiveJob, int, int], None]
+JobFinishedCallback = Callable[[ArchiveJob, Optional[Exception]], None]  # exception: None, if successful
+
+
+class ArchiveJobQueue:
+    """ runs the archive jobs one after another in a worker thread
+
+        The callbacks are called in the worker thread.
+        Jobs, which run elsewhere (e.g. in an ArchiveBatch), can be registered, so there is
+        at most one job per task.
+    """
+
+    def __init__(self, on_progress: Optional[JobProgressCallback] = None,
+                 on_finished: Optional[JobFinishedCallback] = None):
+        self._on_progress = on_progress
+        self._on_finished = on_finished
+        self._queue: queue.Queue[ArchiveJob] = queue.Queue()
+        self._jobs: Dict[TaskSerial, ArchiveJob] = {}  # queued and running jobs
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, job: ArchiveJob) -> bool:
+        """ returns False, if there is already a job for the task """
+        with self._lock:
+            if job.task_serial in self._jobs:
+                return False
+            self._jobs[job.task_serial] = job
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+        return True
+
+    def register(self, jobs: List[ArchiveJob]) -> bool:
+        """ returns False (and registers nothing), if there is already a job for one of the tasks """
+        with self._lock:
+            if any(job.task_serial in self._jobs for job in jobs):
+                return False
+            for job in jobs:
+                self._jobs[job.task_serial] = job
+        return True
+
+    def unregister(self, jobs: List[ArchiveJob]) -> None:
+        with self._lock:
+            for job in jobs:
+                if self._jobs.get(job.task_serial, None) is job:
+                    del self._jobs[job.task_serial]
+
+    def get_job(self, task_serial: TaskSerial) -> Optional[ArchiveJob]:
+        with self._lock:
+            return self._jobs.get(task_serial, None)
+
+    def get_jobs(self) -> List[ArchiveJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, task_serial: TaskSerial) -> bool:
+        job = self.get_job(task_serial)
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def cancel_all(self) -> None:
+        for job in self.get_jobs():
+            job.cancel()
+
+    def wait(self) -> None:
+        """ waits until all queued jobs are finished """
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                error = None
+                try:
+                    job.run(progress=lambda done_size, total_size: self._report_progress(job, done_size, total_size))
+                except Exception as e:
+                    error = e
+                with self._lock:
+                    del self._jobs[job.task_serial]
+                if self._on_finished is not None:
+                    self._on_finished(job, error)
+            finally:
+                self._queue.task_done()
+
+    def _report_progress(self, job: ArchiveJob, done_size: int, total_size: int) -> None:
+        if self._on_progress is not None:
+            self._on_progress(job, done_size, total_size)
+
+
+@dataclass
+class ArchiveSelection:
+    """ selects ACTIVE tasks for zipping; all given criteria must be met """
+    min_age_days: Optional[float] = 365.0  # since the last change of a file in the task dir
+    min_size: Optional[int] = None  # total size of the files
+    categories: Optional[Set[str]] = None
+
+
+class ArchiveBatch:
+    """ zips several task dirs in a thread pool (zlib releases the GIL) and reads the caches of the new zip files
+
+        Changes only the file system (see TaskModel.finish_archive_batch()).
+    """
+
+    def __init__(self, jobs: List[ArchiveJob], max_workers: int = 4):
+        self.jobs = jobs
+        self.caches: List[TaskCache] = []  # of the new zip files
+        self.errors: Dict[TaskSerial, Exception] = {}
+        self._max_workers = max_workers
+
+    def cancel(self) -> None:
+        for job in self.jobs:
+            job.cancel()
+
+    def run(self, progress: Optional[ProgressCallback] = None) -> None:
+        """ progress: number of finished jobs, number of jobs """
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {executor.submit(self._run_job, job): job for job in self.jobs}
+            for i, future in enumerate(as_completed(futures)):
+                try:
+                    self.caches.append(future.result())
+                except Exception as e:
+                    self.errors[futures[future].task_serial] = e
+                if progress is not None:
+                    progress(i + 1, len(self.jobs))
+
+    @staticmethod
+    def _run_job(job: ArchiveJob) -> TaskCache:
+        job.run()
+        return TaskZipFile(job.target_path).read()
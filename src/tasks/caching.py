@@ -19,16 +19,21 @@ from __future__ import annotations
 
 import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
-from typing import Dict, List, Iterator, Optional, Any, Tuple, Pattern
+from typing import Dict, List, Iterator, Optional, Any, Tuple, Pattern, Iterable, Callable
 from datetime import datetime
 from zipfile import ZipFile
 
 import yaml
 
 from tasks.db import DB, Row
+from tasks.fulltext import TaskFullTextIndex
+from tasks.walking import walk, WalkEntry
+from tasks.zipindex import ZipMember, ZipMemberIndex, read_zip_members
 
 TaskSerial = int
 RGB = Tuple[int, int, int]
@@ -52,11 +57,15 @@ class TaskCache:
     title_as_fname: str
     readme: str
     file_names: str
+    stamp: ResourceStamp = field(default_factory=lambda: ResourceStamp.unknown())
+    # only set by TaskZipFile.read() (the members are written to the db, but not kept in the model)
+    zip_members: Optional[List[ZipMember]] = field(default=None, compare=False, repr=False)
 
     def get_data(self) -> TaskCacheData:
         return TaskCacheData(files_state=self.files_state,
                              readme=self.readme,
-                             file_names=self.file_names)
+                             file_names=self.file_names,
+                             stamp=self.stamp)
 
     def get_rel_path(self) -> str:
         return f'{self.category}/{self.date_str}-{self.title_as_fname}'
@@ -67,6 +76,18 @@ class TaskCacheData:
     files_state: TaskFilesState
     readme: str
     file_names: str
+    stamp: ResourceStamp = field(default_factory=lambda: ResourceStamp.unknown())
+
+
+@dataclass(frozen=True)
+class ResourceStamp:
+    """ max. mtime and total size of a task resource - if both are unchanged, the cache needs no update """
+    mtime: float
+    size: int
+
+    @staticmethod
+    def unknown() -> ResourceStamp:
+        return ResourceStamp(mtime=0.0, size=-1)
 
 
 class TaskFilesState(Enum):
@@ -95,22 +116,48 @@ class TaskCacheManager:
         self._root = root
 
     def read_resources(self) -> List[TaskResource]:
-        return list(self._read_recursive(self._root))
-
-    def _read_recursive(self, dpath: Path) -> Iterator[TaskResource]:
-        for item in dpath.iterdir():
-            if item.is_dir():
-                if _TASK_DPATH_REX.match(item.name):
-                    yield TaskDir(item)
-                else:
-                    yield from self._read_recursive(item)
-            elif _TASK_ZIPFILE_REX.match(item.name):
-                yield TaskZipFile(item)
+        return list(self._iter_resources())
+
+    def _iter_resources(self) -> Iterator[TaskResource]:
+        for entry in walk(self._root, descend=self.is_no_task_dir):
+            if entry.is_dir:
+                if _TASK_DPATH_REX.match(entry.name):
+                    yield TaskDir(Path(entry.path))
+            elif _TASK_ZIPFILE_REX.match(entry.name):
+                yield TaskZipFile(Path(entry.path))
+
+    @staticmethod
+    def is_no_task_dir(entry: WalkEntry) -> bool:
+        """ the directories above the task dirs (e.g. the categories) """
+        return not _TASK_DPATH_REX.match(entry.name)
+
+    def find_resource_path(self, path: Path) -> Optional[Path]:
+        """ returns the path of the task dir or task zip file, which contains path (or is path) """
+        try:
+            rel_parts = path.relative_to(self._root).parts
+        except ValueError:
+            return None
+        resource_path = self._root
+        for part in rel_parts:
+            resource_path = resource_path / part
+            if _TASK_ZIPFILE_REX.match(part) or _TASK_DPATH_REX.match(part):
+                return resource_path
+        return None
+
+    @staticmethod
+    def create_resource(resource_path: Path) -> Optional[TaskResource]:
+        """ returns None, if there is no task dir or task zip file at resource_path """
+        if resource_path.is_dir():
+            if _TASK_DPATH_REX.match(resource_path.name):
+                return TaskDir(resource_path)
+        elif resource_path.is_file() and _TASK_ZIPFILE_REX.match(resource_path.name):
+            return TaskZipFile(resource_path)
+        return None
 
     @staticmethod
     def read_from_db(db: DB) -> TaskCaches:
         misc_table = db.table('misc')
-        misc_rows = misc_table.select(where_str='key = "task_caches_timestamp"')
+        misc_rows = misc_table.select(where_str='key = ?', where_params=('task_caches_timestamp',))
         assert len(misc_rows) == 1
         misc_row = misc_rows[0]
         update_timestamp = int(misc_row['value'])
@@ -128,44 +175,103 @@ class TaskCacheManager:
                 title_as_fname=row['title_as_fname'],
                 readme=row['readme'],
                 file_names=row['file_names'],
+                stamp=ResourceStamp(mtime=row['resource_mtime'] or 0.0,
+                                    size=-1 if row['resource_size'] is None else row['resource_size']),
             )
         return task_caches
 
-    def write_caches_to_db(self, task_caches: TaskCaches, db: DB) -> None:
+    def write_changed_caches_to_db(self, timestamp: Optional[datetime], changed_caches: List[TaskCache],
+                                   removed_task_serials: Iterable[TaskSerial], db: DB) -> None:
+        """ writes the changed and removed caches; doesn't commit, so the caller can add further changes
+
+            timestamp: None, if only some resources were refreshed (the timestamp of the last scan remains)
+        """
         task_caches_table = db.table('task_caches')
-        task_caches_table.clear()
-        # task_caches_table.create()
-        for cache in task_caches.map.values():
-            row_values = self._create_row_values(cache)
-            new_row = Row(table=task_caches_table, values=row_values)
-            task_caches_table.insert_row(new_row)
+        removed_task_serials = list(removed_task_serials)
+        task_caches_table.delete_many('task_serial = ?', ((task_serial,) for task_serial in removed_task_serials))
+        task_caches_table.delete_many('task_serial = ?', ((cache.task_serial,) for cache in changed_caches))
+        task_caches_table.insert_many(Row(table=task_caches_table, values=self._create_row_values(cache))
+                                      for cache in changed_caches)
+        zip_member_index = ZipMemberIndex(db)
+        zip_member_index.remove_tasks(removed_task_serials)
+        self._update_zip_members(zip_member_index, changed_caches)
+
+        fulltext_index = TaskFullTextIndex(db)
+        if fulltext_index.exists():
+            for task_serial in removed_task_serials:
+                fulltext_index.update_cache(task_serial, readme='', file_names='')
+            for cache in changed_caches:
+                self._update_fulltext_index(fulltext_index, cache)
+
+        if timestamp is not None:
+            self._write_caches_timestamp(timestamp, db)
 
-        print('write_db: ready with caches')
-        print(f'update_time: {task_caches.update_datetime}, = {int(task_caches.update_datetime.timestamp())}')
+    @staticmethod
+    def select_caches(task_caches: Iterable[TaskCache]) -> List[TaskCache]:
+        """ one cache per task, the task dir wins over the zip file (both exist e.g. while the task is zipped) """
+        caches_by_serial: Dict[TaskSerial, TaskCache] = {}
+        for cache in task_caches:
+            old_cache = caches_by_serial.get(cache.task_serial, None)
+            if old_cache is None or old_cache.files_state != TaskFilesState.ACTIVE:
+                caches_by_serial[cache.task_serial] = cache
+        return list(caches_by_serial.values())
+
+    @staticmethod
+    def _write_caches_timestamp(update_datetime: datetime, db: DB) -> None:
+        print(f'update_time: {update_datetime}, = {int(update_datetime.timestamp())}')
 
         misc_table = db.table('misc')
-        where_str = 'key = "task_caches_timestamp"'
-        value = str(int(task_caches.update_datetime.timestamp()))
-        rows = misc_table.select(where_str=where_str)
+        where_str = 'key = ?'
+        where_params = ('task_caches_timestamp',)
+        value = str(int(update_datetime.timestamp()))
+        rows = misc_table.select(where_str=where_str, where_params=where_params)
         if len(rows) == 0:
             row = Row({'key': 'task_caches_timestamp', 'value': value}, misc_table)
             misc_table.insert_row(row)
         else:
-            misc_table.update_row(values={'value': value}, where_str=where_str)
-        db.commit()
+            misc_table.update_row(values={'value': value}, where_str=where_str, where_params=where_params)
 
-    def write_one_cache_to_db(self, task_cache: TaskCache, db: DB) -> None:
-        row_values = self._create_row_values(task_cache)
-        db.table('task_caches').update_row(row_values, where_str=f'task_serial = "{task_cache.task_serial}"')
-        db.commit()
+    def update_caches_in_db(self, task_caches: List[TaskCache], db: DB) -> None:
+        """ updates existing rows; doesn't commit, so the caller can add further changes to the transaction """
+        task_caches_table = db.table('task_caches')
+        task_caches_table.update_many(((self._create_row_values(cache), (cache.task_serial,))
+                                       for cache in task_caches),
+                                      where_str='task_serial = ?')
+        self._update_zip_members(ZipMemberIndex(db), task_caches)
+        fulltext_index = TaskFullTextIndex(db)
+        if fulltext_index.exists():
+            for cache in task_caches:
+                self._update_fulltext_index(fulltext_index, cache)
 
     def insert_one_cache_to_db(self, task_cache: TaskCache, db: DB) -> None:
         task_caches_table = db.table('task_caches')
         row_values = self._create_row_values(task_cache)
         new_row = Row(table=task_caches_table, values=row_values)
         task_caches_table.insert_row(new_row)
+        self._update_fulltext_index_if_exists(task_cache, db)
         db.commit()
 
+    def _update_fulltext_index_if_exists(self, task_cache: TaskCache, db: DB) -> None:
+        fulltext_index = TaskFullTextIndex(db)
+        if fulltext_index.exists():
+            self._update_fulltext_index(fulltext_index, task_cache)
+
+    @staticmethod
+    def _update_fulltext_index(fulltext_index: TaskFullTextIndex, task_cache: TaskCache) -> None:
+        fulltext_index.update_cache(task_cache.task_serial,
+                                    readme='' if task_cache.readme is None else task_cache.readme,
+                                    file_names=task_cache.file_names)
+
+    def _update_zip_members(self, zip_member_index: ZipMemberIndex, task_caches: List[TaskCache]) -> None:
+        zip_member_index.remove_tasks(cache.task_serial for cache in task_caches)
+        self._insert_zip_members(zip_member_index, task_caches)
+
+    @staticmethod
+    def _insert_zip_members(zip_member_index: ZipMemberIndex, task_caches: Iterable[TaskCache]) -> None:
+        for cache in task_caches:
+            if cache.zip_members is not None:
+                zip_member_index.insert_members(cache.task_serial, cache.zip_members)
+
     @staticmethod
     def _create_row_values(task_cache: TaskCache) -> Dict[str, Any]:
         return {
@@ -176,16 +282,64 @@ class TaskCacheManager:
             'title_as_fname': task_cache.title_as_fname,
             'readme': '' if task_cache.readme is None else task_cache.readme,
             'file_names': task_cache.file_names,
+            'resource_mtime': task_cache.stamp.mtime,
+            'resource_size': task_cache.stamp.size,
         }
 
-    @staticmethod
-    def update_state_files_in_db(task_serial: TaskSerial,
-                                 new_files_state: TaskFilesState, db: DB) -> None:
-        task_caches_table = db.table('task_caches')
-        where_str = f'task_serial = {task_serial}'
-        values = {'files_state': new_files_state.name.lower()}
-        task_caches_table.update_row(values=values, where_str=where_str)
-        db.commit()
+
+class TaskResourceReader:
+    """ reads task resources concurrently in a thread pool (reading is mainly I/O) """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self._max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        self._cancel_event = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+    @property
+    def is_canceled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def iter_read(self, task_resources: Iterable[TaskResource]) -> Iterator[TaskCache]:
+        """ yields the caches in the order of completion, stops after cancel() """
+        return self._iter_results(self._read, task_resources)
+
+    def iter_read_changed(self, task_resources: Iterable[TaskResource],
+                          old_stamps: Dict[Path, ResourceStamp]) -> Iterator[Optional[TaskCache]]:
+        """ like iter_read(), but yields None for resources, which stamps are unchanged """
+        return self._iter_results(
+            lambda task_resource: self._read_if_changed(task_resource, old_stamps.get(task_resource.path)),
+            task_resources)
+
+    def _iter_results(self, read_func: Callable[[TaskResource], Optional[TaskCache]],
+                      task_resources: Iterable[TaskResource]) -> Iterator[Optional[TaskCache]]:
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = [executor.submit(read_func, task_resource) for task_resource in task_resources]
+            try:
+                for future in as_completed(futures):
+                    if self.is_canceled:
+                        break
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def _read(self, task_resource: TaskResource) -> Optional[TaskCache]:
+        if not self.is_canceled:
+            return task_resource.read()
+
+    def _read_if_changed(self, task_resource: TaskResource,
+                         old_stamp: Optional[ResourceStamp]) -> Optional[TaskCache]:
+        """ errors are only printed, so e.g. a task dir removed by a zip job doesn't stop the others """
+        if not self.is_canceled:
+            try:
+                stamp = task_resource.read_stamp()
+                if stamp != old_stamp:
+                    return task_resource.read(stamp)
+            except Exception as e:
+                print(f'cannot read {task_resource.path}: {e}')
+        return None
 
 
 class TaskResource:
@@ -194,14 +348,18 @@ class TaskResource:
 
     def __init__(self, path: Path):
         self._path = path
+        self._zip_members: Optional[List[ZipMember]] = None  # set by _read_content() of zip files
 
     @property
     def path(self):
         return self._path
 
-    def read(self) -> TaskCache:
+    def read(self, stamp: Optional[ResourceStamp] = None) -> TaskCache:
+        """ stamp: result of read_stamp(), if already called """
+        if stamp is None:
+            stamp = self.read_stamp()  # before the content, so changes while reading are detected next time
         match = self._TASK_PATH_REX.match(self._path.name)
-        meta_file = self._read_metafile()
+        meta_file, readme, file_names = self._read_content()
         if not meta_file:
             print(f'not meta_file: path={self._path}')
         return TaskCache(
@@ -210,10 +368,19 @@ class TaskResource:
             category=self._path.parent.name,
             date_str=match.group('date_str'),
             title_as_fname=match.group('title_as_fname'),
-            readme=self._read_readme(),
-            file_names=self._read_filenames(),
+            readme=readme,
+            file_names=file_names,
+            stamp=stamp,
+            zip_members=self._zip_members,
         )
 
+    def read_stamp(self) -> ResourceStamp:
+        raise NotImplemented()
+
+    def _read_content(self) -> Tuple[Optional[TaskMetaFileData], Optional[str], str]:
+        """ returns meta file, readme and file names """
+        return self._read_metafile(), self._read_readme(), self._read_filenames()
+
     def _read_filenames(self):
         raise NotImplemented()
 
@@ -231,11 +398,24 @@ class TaskZipFile(TaskResource):
     _TASK_PATH_REX: Pattern[str] = re.compile(r"(?P<date_str>[0-9x]{4,6})-(?P<title_as_fname>.*)\.zip$")
     files_state = TaskFilesState.PASSIVE
 
+    def read_stamp(self) -> ResourceStamp:
+        zip_stat = self._path.stat()
+        return ResourceStamp(mtime=zip_stat.st_mtime, size=zip_stat.st_size)
+
+    def _read_content(self) -> Tuple[Optional[TaskMetaFileData], Optional[str], str]:
+        # open the zip file only once, cause parsing the central directory is expensive
+        with ZipFile(self._path, 'r') as zip_file:
+            self._zip_members = read_zip_members(zip_file)
+            return (self._read_metafile_from(zip_file),
+                    self._read_readme_from(zip_file),
+                    self._read_filenames_from(zip_file))
+
     def _read_filenames(self) -> str:
-        lines = []
         with ZipFile(self._path, 'r') as zip_file:
-            for zip_info in zip_file.infolist():
-                lines.append(zip_info.filename)
+            return self._read_filenames_from(zip_file)
+
+    def _read_filenames_from(self, zip_file: ZipFile) -> str:
+        lines = [zip_info.filename for zip_info in zip_file.infolist()]
         tree = self._create_file_tree(lines)
         return '\n'.join(list(self._iter_file_tree_items(tree, indent='')))
 
@@ -262,27 +442,35 @@ class TaskZipFile(TaskResource):
 
     def _read_readme(self) -> Optional[str]:
         with ZipFile(self._path, 'r') as zip_file:
+            return self._read_readme_from(zip_file)
+
+    @staticmethod
+    def _read_readme_from(zip_file: ZipFile) -> Optional[str]:
+        try:
+            data = zip_file.read('readme.txt')
             try:
-                data = zip_file.read('readme.txt')
-                try:
-                    buf = data.decode('utf-8')
-                    return buf
-                except UnicodeDecodeError:
-                    buf = data.decode('latin1')
-                    return buf
-            except KeyError:
-                return
+                buf = data.decode('utf-8')
+                return buf
+            except UnicodeDecodeError:
+                buf = data.decode('latin1')
+                return buf
+        except KeyError:
+            return
 
     def _read_metafile(self) -> Optional[TaskMetaFileData]:
         with ZipFile(self._path, 'r') as zip_file:
-            try:
-                data = zip_file.read('.meta')
-                buf = data.decode('utf-8')
-                yaml_data = yaml.safe_load(buf)
-                return TaskMetaFileData(
-                    task_serial=int(yaml_data['task_serial']))
-            except KeyError:
-                return
+            return self._read_metafile_from(zip_file)
+
+    @staticmethod
+    def _read_metafile_from(zip_file: ZipFile) -> Optional[TaskMetaFileData]:
+        try:
+            data = zip_file.read('.meta')
+            buf = data.decode('utf-8')
+            yaml_data = yaml.safe_load(buf)
+            return TaskMetaFileData(
+                task_serial=int(yaml_data['task_serial']))
+        except KeyError:
+            return
 
     def write_metafile(self, meta_data: TaskMetaFileData) -> None:
         zip_stat = self._path.stat()
@@ -299,15 +487,20 @@ class TaskDir(TaskResource):
     _TASK_PATH_REX: Pattern[str] = re.compile(r"(?P<date_str>[0-9x]{4,6})-(?P<title_as_fname>.*)$")
     files_state = TaskFilesState.ACTIVE
 
+    def read_stamp(self) -> ResourceStamp:
+        """ max. mtime of the directory tree (incl. the directories, so deletions and renames count too)
+            and the total size of the files
+        """
+        max_mtime = self._path.stat().st_mtime
+        total_size = 0
+        for entry in walk(self._path, with_stat=True):
+            max_mtime = max(max_mtime, entry.mtime)
+            if not entry.is_dir:
+                total_size += entry.size
+        return ResourceStamp(mtime=max_mtime, size=total_size)
+
     def _read_filenames(self) -> str:
-        return '\n'.join(list(self._read_filenames_recursive(self._path, 0)))
-
-    def _read_filenames_recursive(self, dpath: Path, level: int) -> Iterator[str]:
-        indent = '  ' * level
-        for item in dpath.iterdir():
-            yield indent + item.name
-            if item.is_dir():
-                yield from self._read_filenames_recursive(item, level + 1)
+        return '\n'.join('  ' * entry.level + entry.name for entry in walk(self._path))
 
     def _read_readme(self) -> Optional[str]:
         readme_fpath = self._path / 'readme.txt'
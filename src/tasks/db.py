@@ -18,17 +18,20 @@
 from __future__ import annotations
 import sqlite3
 from pathlib import Path
-from typing import Dict, ValuesView, Optional, Any
+from typing import Dict, ValuesView, Optional, Any, Sequence, Iterable, Tuple, List
 
 from tasks.metamodel import MetaModel, Structure
 
 
 class DB:
 
-    def __init__(self, sqlite_path: Path, meta_model_: MetaModel, logging_enabled: bool = False):
+    def __init__(self, sqlite_path: Path, meta_model_: MetaModel, logging_enabled: bool = False,
+                 connection_pragmas: Optional[Dict[str, Any]] = None):
+        """ connection_pragmas: e.g. {'journal_mode': 'wal', 'synchronous': 'normal'} """
         self._sqlite_path = sqlite_path
         self._meta_model = meta_model_
         self._logging_enabled = logging_enabled
+        self._connection_pragmas = connection_pragmas or {}
         self._tables = self._create_table_map(meta_model_)
         self._conn: Optional[sqlite3.Connection] = None
         
@@ -56,8 +59,9 @@ class DB:
         
     def create(self) -> None:
         self._del_db_if_exists()
-        self.open()
+        self._connect()
         self._create_tables()
+        self._create_indexes()
         self._conn.commit()
         
     def _del_db_if_exists(self) -> None:
@@ -67,28 +71,70 @@ class DB:
     def _create_tables(self) -> None:
         for table in self.tables:
             table.create()
+
+    def _create_indexes(self) -> None:
+        for table in self.tables:
+            table.create_indexes()
             
     def open(self) -> None:
+        self._connect()
+        self._create_missing_tables()
+        self._add_missing_columns()
+        self._create_indexes()  # adds missing indexes to existing databases
+        self._conn.commit()
+
+    def _connect(self) -> None:
         sqlite_pathname = str(self._sqlite_path)
         self._conn = sqlite3.connect(sqlite_pathname)
         self._conn.row_factory = sqlite3.Row
+        for name, value in self._connection_pragmas.items():
+            self.execute_sql(f'pragma {name} = {value}')
+
+    def _create_missing_tables(self) -> None:
+        cursor = self.execute_sql("select name from sqlite_master where type = 'table'")
+        existing_table_names = set(row['name'] for row in cursor.fetchall())
+        missing_tables = [table for table in self.tables
+                          if table.name not in existing_table_names]
+        for table in missing_tables:
+            table.create()
+
+    def _add_missing_columns(self) -> None:
+        for table in self.tables:
+            table.add_missing_columns()
         
-    def execute_sql(self, sql_cmd: str) -> sqlite3.Cursor:
+    def execute_sql(self, sql_cmd: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
         if self._logging_enabled:
             print(sql_cmd)
         cursor = self._conn.cursor()
-        cursor.execute(sql_cmd)
+        cursor.execute(sql_cmd, params)
+        return cursor
+
+    def execute_many(self, sql_cmd: str, params_seq: Iterable[Sequence[Any]]) -> sqlite3.Cursor:
+        if self._logging_enabled:
+            print(sql_cmd)
+        cursor = self._conn.cursor()
+        cursor.executemany(sql_cmd, params_seq)
         return cursor
         
     def commit(self) -> None:
         self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
         
 
 class Table:
+    """ all statements use bound parameters, so sqlite3 can reuse the compiled statements
+
+        The *_many() methods don't commit, so they run in the same transaction as the
+        other changes until DB.commit() is called.
+    """
 
     def __init__(self, struct: Structure, db_: DB):
         self._struct = struct
         self._db = db_
+        self._insert_sql: Optional[str] = None
+        self._update_sqls: Dict[Tuple[Tuple[str, ...], str], str] = {}
         
     @property
     def name(self) -> str:
@@ -108,31 +154,90 @@ class Table:
         sql_cmd = f"create table {self.name} ({fields_str})"
         self._execute_sql(sql_cmd)
 
+    def add_missing_columns(self) -> None:
+        """ the new columns of existing rows are null """
+        cursor = self._execute_sql(f'pragma table_info({self.name})')
+        existing_names = set(row['name'] for row in cursor.fetchall())
+        for attr in self.attributes:
+            if attr.name not in existing_names:
+                self._execute_sql(f'alter table {self.name} add column {attr.name} {attr.type.sqlite3_typename}')
+
+    def create_indexes(self) -> None:
+        for index_name, index in self._struct.indexes:
+            sql_index_name = f'{self.name}_{index_name}'
+            names_str = ', '.join(index.attribute_names)
+            unique_str = 'unique ' if index.is_unique else ''
+            sql_cmd = f'create {unique_str}index if not exists {sql_index_name} on {self.name} ({names_str})'
+            try:
+                self._execute_sql(sql_cmd)
+            except sqlite3.IntegrityError:
+                print(f'{self.name}: duplicate {names_str} => create index {sql_index_name} as not unique')
+                self._execute_sql(f'create index if not exists {sql_index_name} on {self.name} ({names_str})')
+
     def clear(self) -> None:
         sql_cmd = f"delete from {self.name}"
         self._execute_sql(sql_cmd)
 
+    def delete_rows(self, where_str: str, where_params: Sequence[Any] = ()) -> None:
+        sql_cmd = f"delete from {self.name} where {where_str}"
+        self._execute_sql(sql_cmd, where_params)
+
+    def delete_many(self, where_str: str, where_params_list: Iterable[Sequence[Any]]) -> None:
+        sql_cmd = f"delete from {self.name} where {where_str}"
+        self._db.execute_many(sql_cmd, where_params_list)
+
     def insert_row(self, row: Row) -> None:
-        values = [f'"{row.value(x.name)}"' for x in self.attributes]
-        values_str = ', '.join(values)
-        sql_cmd = f'insert into {self.name} values ({values_str})'
-        self._execute_sql(sql_cmd)
-        
-    def update_row(self, values: Dict[str, Any], where_str: str) -> None:
-        value_list = [f'{key}="{value}"' for key, value in values.items()]
-        values_str = ', '.join(value_list)
-        sql_cmd = f'update {self.name} set {values_str} where {where_str}'
-        self._execute_sql(sql_cmd)
+        self._execute_sql(self._get_insert_sql(), self._get_row_params(row))
+
+    def insert_many(self, rows: Iterable[Row]) -> None:
+        self._db.execute_many(self._get_insert_sql(), (self._get_row_params(row) for row in rows))
+
+    def _get_insert_sql(self) -> str:
+        if self._insert_sql is None:
+            names = [x.name for x in self.attributes]
+            names_str = ', '.join(names)
+            placeholders_str = ', '.join('?' for _ in names)
+            self._insert_sql = f'insert into {self.name} ({names_str}) values ({placeholders_str})'
+        return self._insert_sql
+
+    def _get_row_params(self, row: Row) -> List[Any]:
+        return [row.value(x.name) for x in self.attributes]
+
+    def update_row(self, values: Dict[str, Any], where_str: str, where_params: Sequence[Any] = ()) -> None:
+        sql_cmd = self._get_update_sql(tuple(values.keys()), where_str)
+        self._execute_sql(sql_cmd, self._get_update_params(values, where_params))
+
+    def update_many(self, items: Iterable[Tuple[Dict[str, Any], Sequence[Any]]], where_str: str) -> None:
+        """ items: (values, where_params) - all values must have the same keys """
+        items = list(items)
+        if items:
+            sql_cmd = self._get_update_sql(tuple(items[0][0].keys()), where_str)
+            self._db.execute_many(sql_cmd, (self._get_update_params(values, where_params)
+                                            for values, where_params in items))
+
+    def _get_update_sql(self, keys: Tuple[str, ...], where_str: str) -> str:
+        sql_key = keys, where_str
+        sql_cmd = self._update_sqls.get(sql_key, None)
+        if sql_cmd is None:
+            values_str = ', '.join(f'{key} = ?' for key in keys)
+            sql_cmd = f'update {self.name} set {values_str} where {where_str}'
+            self._update_sqls[sql_key] = sql_cmd
+        return sql_cmd
+
+    def _get_update_params(self, values: Dict[str, Any], where_params: Sequence[Any]) -> List[Any]:
+        params = [self.attribute(key).type.convert_to_db(value) for key, value in values.items()]
+        params.extend(where_params)
+        return params
 
-    def select(self, where_str: str = ''):
+    def select(self, where_str: str = '', where_params: Sequence[Any] = ()):
         sql_cmd = f"select * from {self.name}"
         if where_str:
             sql_cmd += f' where {where_str}'
-        cursor = self._execute_sql(sql_cmd)
+        cursor = self._execute_sql(sql_cmd, where_params)
         return cursor.fetchall()
         
-    def _execute_sql(self, sql_cmd):
-        return self._db.execute_sql(sql_cmd)
+    def _execute_sql(self, sql_cmd: str, params: Sequence[Any] = ()):
+        return self._db.execute_sql(sql_cmd, params)
         
 
 class Row:
@@ -0,0 +1,106 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import sqlite3
+from typing import List, Iterable, Optional
+
+from tasks.db import DB, Row
+
+TaskSerial = int
+
+
+class TaskFullTextIndex:
+    """ optional FTS5 table in tasks.sqlite (rowid = task serial)
+
+        Contains the title and the plain text of the last revision and
+        the readme and file names of the task cache.
+    """
+    TABLE_NAME = 'tasks_fts'
+    STATE_KEY = 'tasks_fts_state'  # in the misc table
+
+    def __init__(self, db: DB):
+        self._db = db
+
+    def exists(self) -> bool:
+        sql_cmd = "select name from sqlite_master where type = 'table' and name = ?"
+        rows = self._db.execute_sql(sql_cmd, (self.TABLE_NAME,)).fetchall()
+        return len(rows) > 0
+
+    def create(self) -> bool:
+        """ returns False, if sqlite3 was built without FTS5 """
+        sql_cmd = f'create virtual table if not exists {self.TABLE_NAME} ' \
+                  f'using fts5(title, body, readme, file_names)'
+        try:
+            self._db.execute_sql(sql_cmd)
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def drop(self) -> None:
+        self._db.execute_sql(f'drop table if exists {self.TABLE_NAME}')
+
+    def count_rows(self) -> int:
+        rows = self._db.execute_sql(f'select count(*) from {self.TABLE_NAME}').fetchall()
+        return rows[0][0]
+
+    def clear(self) -> None:
+        self._db.execute_sql(f'delete from {self.TABLE_NAME}')
+
+    def read_state(self) -> Optional[str]:
+        """ the state of the tasks, when the index was written last (see write_state()) """
+        rows = self._db.table('misc').select(where_str='key = ?', where_params=(self.STATE_KEY,))
+        return rows[0]['value'] if rows else None
+
+    def write_state(self, state: str) -> None:
+        """ state: changes, if the tasks are changed by a program, which doesn't update the index """
+        misc_table = self._db.table('misc')
+        if misc_table.select(where_str='key = ?', where_params=(self.STATE_KEY,)):
+            misc_table.update_row(values={'value': state}, where_str='key = ?', where_params=(self.STATE_KEY,))
+        else:
+            misc_table.insert_row(Row({'key': self.STATE_KEY, 'value': state}, misc_table))
+
+    def update_revision(self, task_serial: TaskSerial, title: str, body_text: str) -> None:
+        sql_cmd = f'update {self.TABLE_NAME} set title = ?, body = ? where rowid = ?'
+        cursor = self._db.execute_sql(sql_cmd, (title, body_text, task_serial))
+        if cursor.rowcount == 0:
+            self._insert(task_serial, title=title, body_text=body_text, readme='', file_names='')
+
+    def update_cache(self, task_serial: TaskSerial, readme: str, file_names: str) -> None:
+        sql_cmd = f'update {self.TABLE_NAME} set readme = ?, file_names = ? where rowid = ?'
+        cursor = self._db.execute_sql(sql_cmd, (readme, file_names, task_serial))
+        if cursor.rowcount == 0:
+            self._insert(task_serial, title='', body_text='', readme=readme, file_names=file_names)
+
+    def _insert(self, task_serial: TaskSerial, title: str, body_text: str, readme: str, file_names: str) -> None:
+        sql_cmd = f'insert into {self.TABLE_NAME} (rowid, title, body, readme, file_names) values (?, ?, ?, ?, ?)'
+        self._db.execute_sql(sql_cmd, (task_serial, title, body_text, readme, file_names))
+
+    def search(self, words: Iterable[str]) -> List[TaskSerial]:
+        """ returns the serials of the tasks, which contains all words as prefixes, the best matches first """
+        match_str = ' '.join(self._create_prefix_query(word) for word in words)
+        if not match_str:
+            return []
+        sql_cmd = f'select rowid from {self.TABLE_NAME} where {self.TABLE_NAME} match ? ' \
+                  f'order by bm25({self.TABLE_NAME})'
+        return [row[0] for row in self._db.execute_sql(sql_cmd, (match_str,)).fetchall()]
+
+    @staticmethod
+    def _create_prefix_query(word: str) -> str:
+        quoted_word = word.replace('"', '""')
+        return f'"{quoted_word}"*'
@@ -20,9 +20,9 @@ from __future__ import annotations
 from collections import OrderedDict
 from configparser import RawConfigParser
 from pathlib import Path
-from typing import Dict, ValuesView, Any
+from typing import Dict, ValuesView, Any, ItemsView, Tuple
 
-from tasks.tasktypes import Date, ID, Int, Ref, String, XmlString  # necessary for MetaModel._process_section()
+from tasks.tasktypes import Date, Float, ID, Int, Ref, String, XmlString  # necessary for MetaModel._process_section()
 
 
 class MetaModel:
@@ -52,8 +52,12 @@ class MetaModel:
         for key, value in section.items():
             if self._logging_enabled:
                 print(f'{key}: {value}')
-            new_attr = Attribute(key, eval(value))
-            new_struct.add_attribute(new_attr)
+            type_or_index = eval(value)
+            if isinstance(type_or_index, Index):
+                new_struct.add_index(key, type_or_index)
+            else:
+                new_attr = Attribute(key, type_or_index)
+                new_struct.add_attribute(new_attr)
         return new_struct
 
 
@@ -62,6 +66,7 @@ class Structure:
     def __init__(self, name: str):
         self._name = name
         self._attributes: Dict[str, Attribute] = OrderedDict()
+        self._indexes: Dict[str, Index] = OrderedDict()
         
     @property
     def name(self) -> str:
@@ -77,6 +82,15 @@ class Structure:
     def add_attribute(self, attribute: Attribute) -> None:
         self._attributes[attribute.name] = attribute
 
+    @property
+    def indexes(self) -> ItemsView[str, Index]:
+        return self._indexes.items()
+
+    def add_index(self, name: str, index: Index) -> None:
+        for attr_name in index.attribute_names:
+            assert attr_name in self._attributes, f'{self._name}.{name}: unknown attribute {attr_name}'
+        self._indexes[name] = index
+
 
 class Attribute:
 
@@ -91,3 +105,20 @@ class Attribute:
     @property
     def type(self) -> Any:
         return self._type
+
+
+class Index:
+    """ secondary index, e.g. 'rev_index: Index('task_serial', 'rev_no')' in tasks.ini """
+    is_unique = False
+
+    def __init__(self, *attribute_names: str):
+        self._attribute_names = attribute_names
+
+    @property
+    def attribute_names(self) -> Tuple[str, ...]:
+        return self._attribute_names
+
+
+class PrimaryKey(Index):
+    """ is created as unique index, so it can be added to existing tables too """
+    is_unique = True
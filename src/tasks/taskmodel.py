@@ -18,29 +18,41 @@
 from __future__ import annotations
 
 import re
-import shutil
+from bisect import bisect_left
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, List, Iterable, Any, Iterator, Set
+from typing import Optional, Dict, List, Iterable, Any, Iterator, Set, Tuple, Sequence
 import yaml
 
-from tasks.caching import TaskCache, TaskCacheManager, TaskCaches, TaskCacheData, TaskFilesState, RGB, TaskDir
+from tasks.archiving import ArchiveSelection, ArchiveBatch, ArchiveJob, ArchiveAction
+from tasks.caching import TaskCache, TaskCacheManager, TaskCacheData, TaskFilesState, RGB, TaskDir, \
+    ResourceStamp, TaskResourceReader
 from tasks.db import Row, DB
+from tasks.fulltext import TaskFullTextIndex
+from tasks.page import Page
 from tasks.xml_reading import read_from_xmlstr
-from tasks.zipping import Unzipper, Zipper
+from tasks.zipindex import ZipMemberIndex, ZipMember
+from tasks.zipping import CompressionPolicy
 
 TaskSerial = int
 
 
 class TaskModel:
 
-    def __init__(self, db: DB, tasks_root: Path, word_extractor: WordExtractor):
+    def __init__(self, db: DB, tasks_root: Path, word_extractor: WordExtractor, fulltext_enabled: bool = False):
         self._db = db
         self._tasks_root = tasks_root
         self._tasks_revisions_table = self._db.table('tasks_revisions')
+        self._revision_words_table = self._db.table('task_revision_words')
+        self._cache_words_table = self._db.table('task_cache_words')
         self._word_extractor = word_extractor
         self._tasks: Dict[int, Task] = {}
+        self._word_index = WordIndex()
+        self._fulltext_index = TaskFullTextIndex(db)
+        self._fulltext_enabled = fulltext_enabled
+        self._cache_timestamp = 0
         self._default_rev = TaskRevision.create_default()
+        self._passive_tasks_by_path: Optional[Dict[Path, Task]] = None  # built on demand
 
     @property
     def db(self):
@@ -58,24 +70,79 @@ class TaskModel:
     def word_extractor(self):
         return self._word_extractor
 
+    @property
+    def word_index(self):
+        return self._word_index
+
+    @property
+    def fulltext_enabled(self):
+        return self._fulltext_enabled
+
     def read(self) -> None:
         self._db.open()
         self._tasks.clear()
+        self._word_index.clear()
         task_revision_map = self._read_task_revisions()
         self._tasks = {serial: Task(serial, sorted(revs, key=lambda x: x.rev_no), self)
                        for serial, revs in task_revision_map.items()}
         self._read_task_caches()
+        self._open_fulltext_index()
 
     def _read_task_revisions(self) -> Dict[TaskSerial, List[TaskRevision]]:
+        """ reads only the first and the last revision of each task
+
+            The other revisions are read on demand (see read_revisions_of_task()).
+        """
+        rev_table_name = self._tasks_revisions_table.name
+        where_str = 'r.rev_no = 1 or r.rev_no = l.last_rev_no'
+        join_str = f'join (select task_serial, max(rev_no) as last_rev_no from {rev_table_name} ' \
+                   f'group by task_serial) l on r.task_serial = l.task_serial'
+
         task_revision_map: Dict[int, List[TaskRevision]] = {}
-        for row in self._tasks_revisions_table.select():
-            task_rev = TaskRevision(word_extractor=self._word_extractor, **row)
+        revisions_without_words: Set[TaskRevision] = set()
+        for task_rev, has_words in self._iter_revisions_with_words(where_str, join_str=join_str):
             task_serial = task_rev.task_serial
             if task_serial not in task_revision_map:
                 task_revision_map[task_serial] = [self._default_rev]
             task_revision_map[task_serial].append(task_rev)
+            if not has_words:
+                revisions_without_words.add(task_rev)
+
+        # only the words of the last revisions are needed for searching, so the older ones stay unparsed
+        last_revisions_without_words = [
+            task_rev for task_rev in (max(revs, key=lambda x: x.rev_no) for revs in task_revision_map.values())
+            if task_rev in revisions_without_words]
+        if last_revisions_without_words:
+            self._insert_revision_words(last_revisions_without_words)
+            self._db.commit()
         return task_revision_map
 
+    def read_revisions_of_task(self, task_serial: TaskSerial) -> List[TaskRevision]:
+        revisions = [task_rev for task_rev, _ in self._iter_revisions_with_words('r.task_serial = ?', (task_serial,))]
+        return [self._default_rev] + sorted(revisions, key=lambda x: x.rev_no)
+
+    def _iter_revisions_with_words(self, where_str: str, where_params: Sequence[Any] = (),
+                                   join_str: str = '') -> Iterator[Tuple[TaskRevision, bool]]:
+        rev_table_name = self._tasks_revisions_table.name
+        words_table_name = self._revision_words_table.name
+        attr_names = [attr.name for attr in self._tasks_revisions_table.attributes]
+        sql_cmd = f'select r.*, w.words as revision_words from {rev_table_name} r {join_str} ' \
+                  f'left join {words_table_name} w on w.task_serial = r.task_serial and w.rev_no = r.rev_no ' \
+                  f'where {where_str}'
+        for row in self._db.execute_sql(sql_cmd, where_params).fetchall():
+            words_str = row['revision_words']
+            words = _split_words(words_str) if words_str is not None else None
+            rev_values = {name: row[name] for name in attr_names}
+            task_rev = TaskRevision(word_extractor=self._word_extractor, words=words, lazy=True, **rev_values)
+            yield task_rev, words_str is not None
+
+    def _insert_revision_words(self, task_revisions: Iterable[TaskRevision]) -> None:
+        table = self._revision_words_table
+        table.insert_many(Row(table=table, values={'task_serial': task_rev.task_serial,
+                                                   'rev_no': task_rev.rev_no,
+                                                   'words': _join_words(task_rev.words)})
+                          for task_rev in task_revisions)
+
     def _read_task_caches(self) -> None:
         cache_mgr = TaskCacheManager(self._tasks_root)
         task_caches = cache_mgr.read_from_db(self._db)
@@ -83,24 +150,112 @@ class TaskModel:
             if cache.task_serial not in self._tasks:
                 raise Exception(f'task_cache: task {cache.task_serial} not found')
 
+        self._cache_timestamp = int(task_caches.update_datetime.timestamp())
+        cache_words_map = self._read_cache_words()
+        tasks_without_cache_words: List[Task] = []
         for task in self._tasks.values():
             cache = task_caches.map.get(task.serial, None)
             cache_data = cache.get_data() if cache is not None else None
-            task.set_cache(cache_data, self._word_extractor)
+            cache_words = cache_words_map.get(task.serial, None) if cache_data is not None else None
+            task.set_cache(cache_data, self._word_extractor, cache_words=cache_words)
+            if cache_data is not None and cache_words is None:
+                tasks_without_cache_words.append(task)
+
+        if tasks_without_cache_words:
+            self._write_cache_words(tasks_without_cache_words)
+            self._db.commit()
+
+    def _read_cache_words(self) -> Dict[TaskSerial, Set[str]]:
+        """ returns the persisted cache words, which are not older than the task caches """
+        rows = self._cache_words_table.select(where_str='cache_timestamp = ?', where_params=(self._cache_timestamp,))
+        return {row['task_serial']: _split_words(row['words']) for row in rows}
+
+    def _write_cache_words(self, tasks: Iterable[Task]) -> None:
+        table = self._cache_words_table
+        tasks = list(tasks)
+        table.delete_many('task_serial = ?', ((task.serial,) for task in tasks))
+        table.insert_many(self._create_cache_words_row(task) for task in tasks if task.cache is not None)
+
+    def _create_cache_words_row(self, task: Task) -> Row:
+        return Row(table=self._cache_words_table, values={'task_serial': task.serial,
+                                                          'cache_timestamp': self._cache_timestamp,
+                                                          'words': _join_words(task.cache_words)})
+
+    def _open_fulltext_index(self) -> None:
+        fulltext_index = self._fulltext_index
+        if not self._fulltext_enabled:
+            if fulltext_index.exists():  # would not be updated anymore
+                fulltext_index.drop()
+                self._db.commit()
+            return
+
+        if not fulltext_index.exists() and not fulltext_index.create():
+            print('sqlite3 supports no FTS5 => fulltext search disabled')
+            self._fulltext_enabled = False
+            return
+
+        if fulltext_index.count_rows() != len(self._tasks) or fulltext_index.read_state() != self._get_fulltext_state():
+            self._rebuild_fulltext_index()
+
+    def _get_fulltext_state(self) -> str:
+        """ changes with each new revision and each complete cache update """
+        rev_no_sum = sum(task.last_revision.rev_no for task in self._tasks.values())
+        return f'{rev_no_sum}:{self._cache_timestamp}'
+
+    def _write_fulltext_state(self) -> None:
+        if self._fulltext_enabled:
+            self._fulltext_index.write_state(self._get_fulltext_state())
+
+    def _rebuild_fulltext_index(self) -> None:
+        print('rebuild fulltext index...')
+        fulltext_index = self._fulltext_index
+        fulltext_index.clear()
+        for task in self._tasks.values():
+            task_rev = task.last_revision
+            fulltext_index.update_revision(task.serial, title=task_rev.title, body_text=task_rev.get_body_text())
+            if task.cache is not None:
+                fulltext_index.update_cache(task.serial, readme=task.cache.readme or '',
+                                            file_names=task.cache.file_names)
+        self._write_fulltext_state()
+        self._db.commit()
+        print('ready (fulltext index rebuilt)')
 
-    def update_cache_of_active_tasks(self) -> None:
-        print('update caches of active tasks...')
+    def get_active_task_dirs(self) -> Tuple[List[TaskDir], Dict[Path, ResourceStamp]]:
+        """ returns the dirs of the active tasks and their current stamps
+
+            The caches of these dirs can be read in a worker thread (see read_changed_caches()),
+            the results must be passed to update_active_task_caches() in the thread of the model.
+        """
+        task_dirs = []
+        old_stamps = {}
         for task in self._tasks.values():
             if task.cache and task.cache.files_state == TaskFilesState.ACTIVE:
-                task_dir = TaskDir(task.get_path(self._tasks_root))
-                cache = task_dir.read()
-                cache_data = cache.get_data()
-                if cache_data != task.cache:
-                    task.set_cache(cache_data, self._word_extractor)
-                    cache_mgr = TaskCacheManager(self._tasks_root)
-                    cache_mgr.write_one_cache_to_db(task_cache=cache, db=self._db)
-        self._db.commit()
-        print('ready (caches updated)')
+                task_dpath = task.get_path(self._tasks_root)
+                task_dirs.append(TaskDir(task_dpath))
+                old_stamps[task_dpath] = task.cache.stamp
+        return task_dirs, old_stamps
+
+    def update_active_task_caches(self, changed_caches: List[TaskCache]) -> List[TaskSerial]:
+        """ writes all changes in one transaction, returns the serials of the updated tasks """
+        updated_caches = []
+        updated_tasks = []
+        for cache in changed_caches:
+            task = self._tasks.get(cache.task_serial, None)
+            if task is None or task.files_state != TaskFilesState.ACTIVE \
+                    or task.get_rel_path() != cache.get_rel_path():
+                continue  # task was changed in the meantime
+            cache_data = cache.get_data()
+            if cache_data != task.cache:
+                task.set_cache(cache_data, self._word_extractor)
+                updated_caches.append(cache)
+                updated_tasks.append(task)
+
+        if updated_caches:
+            cache_mgr = TaskCacheManager(self._tasks_root)
+            cache_mgr.update_caches_in_db(updated_caches, db=self._db)
+            self._write_cache_words(updated_tasks)
+            self._db.commit()
+        return [task.serial for task in updated_tasks]
 
     def create_new_task(self, task_serial: Optional[int] = None) -> Task:
         if task_serial is None:
@@ -125,6 +280,11 @@ class TaskModel:
                       for x in tasks_revisions_table.attributes}
         new_row = Row(table=tasks_revisions_table, values=row_values)
         tasks_revisions_table.insert_row(new_row)
+        self._insert_revision_words([task_rev])
+        if self._fulltext_enabled:
+            self._fulltext_index.update_revision(task_rev.task_serial, title=task_rev.title,
+                                                 body_text=task_rev.get_body_text())
+        self._write_fulltext_state()
         self._db.commit()
 
     def get_sorted_categories(self) -> List[str]:
@@ -143,10 +303,182 @@ class TaskModel:
     def get_task(self, task_serial: int) -> Task:
         return self._tasks[task_serial]
 
+    def iter_filtered_tasks(self, search_words: Iterable[str],
+                            category: str, files_state: str) -> Iterator[Task]:
+        task_serials = self._word_index.find_tasks(search_words)
+        if task_serials is None:
+            tasks = self._tasks.values()
+        else:
+            tasks = (self._tasks[serial] for serial in task_serials)
+        for task in tasks:
+            if task.does_meet_the_filter(category, files_state):
+                yield task
+
+    def iter_ranked_tasks(self, search_words: Iterable[str],
+                          category: str, files_state: str) -> Iterator[Task]:
+        """ like iter_filtered_tasks(), but uses the fulltext index and yields the best matches first
+
+            Without search words all tasks of the filter are yielded (unsorted) like by iter_filtered_tasks().
+        """
+        search_words = list(search_words)
+        if not search_words:
+            yield from self.iter_filtered_tasks(search_words, category, files_state)
+            return
+        for task_serial in self._fulltext_index.search(search_words):
+            task = self._tasks.get(task_serial, None)
+            if task is not None and task.does_meet_the_filter(category, files_state):
+                yield task
+
     def extract_words(self, text: str) -> Set[str]:
         return self._word_extractor.get_words(text)
 
-    def update_cache(self, timestamp: datetime, task_cache_list: List[TaskCache]) -> None:
+    def get_resource_stamps(self) -> Dict[Path, ResourceStamp]:
+        """ path -> stamp of the task resources known by the caches """
+        return {task.get_path(self._tasks_root): task.cache.stamp
+                for task in self._tasks.values()
+                if task.cache and task.cache.files_state in (TaskFilesState.ACTIVE, TaskFilesState.PASSIVE)}
+
+    def update_cache_incremental(self, timestamp: datetime, changed_caches: List[TaskCache],
+                                 found_paths: Set[Path]) -> None:
+        """ changed_caches: new caches of the resources, which were changed or are new
+            found_paths: the paths of all existing resources (changed or not)
+        """
+        self._check_caches(changed_caches)
+        changed_task_serials = set(cache.task_serial for cache in changed_caches)
+        removed_tasks = [task for task_path, task in self._iter_tasks_by_resource_path()
+                         if task_path not in found_paths and task.serial not in changed_task_serials]
+        self._apply_cache_changes(timestamp, changed_caches, removed_tasks)
+
+    def refresh_resources(self, resource_paths: Iterable[Path]) -> List[TaskSerial]:
+        """ re-reads only the given task dirs and zip files (e.g. reported by a watcher)
+
+            Resources, which don't exist anymore, are removed from the caches.
+            Returns the serials of the changed tasks.
+        """
+        changed_caches, missing_paths = read_refreshed_resources(self._tasks_root, set(resource_paths),
+                                                                 self.get_resource_stamps())
+        return self.apply_refreshed_resources(changed_caches, missing_paths)
+
+    def apply_refreshed_resources(self, changed_caches: List[TaskCache], missing_paths: Set[Path]) -> List[TaskSerial]:
+        """ second part of refresh_resources(), after read_refreshed_resources() ran in a worker thread """
+        changed_caches = [cache for cache in changed_caches if self._is_cache_of_known_task(cache)]
+        changed_task_serials = set(cache.task_serial for cache in changed_caches)
+        removed_tasks = [task for task_path, task in self._iter_tasks_by_resource_path()
+                         if task_path in missing_paths and task.serial not in changed_task_serials]
+        if changed_caches or removed_tasks:
+            self._apply_cache_changes(None, changed_caches, removed_tasks)
+        return [task.serial for task in removed_tasks] + sorted(changed_task_serials)
+
+    def find_zip_member(self, zip_fpath: Path, member_name: str) -> Optional[ZipMember]:
+        """ -> the indexed member, None if the index wasn't written for the current zip file
+
+            Only reads tasks.sqlite, the member can be opened by open_zipped_file() in a worker thread.
+        """
+        task = self._find_passive_task(zip_fpath)
+        if task is not None:
+            try:
+                zip_stat = zip_fpath.stat()
+            except OSError:
+                return None
+            if task.cache.stamp == ResourceStamp(mtime=zip_stat.st_mtime, size=zip_stat.st_size):
+                return ZipMemberIndex(self._db).find_member(task.serial, member_name)
+        return None
+
+    def _find_passive_task(self, zip_fpath: Path) -> Optional[Task]:
+        if self._passive_tasks_by_path is None:
+            self._passive_tasks_by_path = {task_path: task for task_path, task in self._iter_tasks_by_resource_path()
+                                           if task.files_state == TaskFilesState.PASSIVE}
+        return self._passive_tasks_by_path.get(zip_fpath, None)
+
+    def invalidate_task_paths(self) -> None:
+        """ called by the tasks, when their path or files state may have changed """
+        self._passive_tasks_by_path = None
+
+    def select_tasks_to_archive(self, selection: ArchiveSelection, now: Optional[datetime] = None) -> List[Task]:
+        """ returns the ACTIVE tasks, which meet the selection (uses the stamps of the caches) """
+        if now is None:
+            now = datetime.now()
+        selected_tasks = []
+        for task in self._tasks.values():
+            if task.files_state != TaskFilesState.ACTIVE or task.cache.stamp.size < 0:
+                continue  # stamp unknown => task dir wasn't read since the stamps were introduced
+            stamp = task.cache.stamp
+            if selection.min_age_days is not None \
+                    and now.timestamp() - stamp.mtime < selection.min_age_days * 24 * 60 * 60:
+                continue
+            if selection.min_size is not None and stamp.size < selection.min_size:
+                continue
+            if selection.categories is not None and task.last_revision.category not in selection.categories:
+                continue
+            selected_tasks.append(task)
+        return selected_tasks
+
+    def create_archive_batch(self, tasks: Iterable[Task], max_workers: int = 4,
+                             policy: Optional[CompressionPolicy] = None) -> ArchiveBatch:
+        """ the batch can run in a worker thread, afterwards finish_archive_batch() must be called """
+        jobs = [ArchiveJob(task.serial, ArchiveAction.ZIP, task.get_path(self._tasks_root), policy=policy)
+                for task in tasks]
+        return ArchiveBatch(jobs, max_workers=max_workers)
+
+    def finish_archive_batch(self, batch: ArchiveBatch) -> List[TaskSerial]:
+        """ writes the new states of all zipped tasks in one transaction, returns their serials """
+        changed_caches = [cache for cache in batch.caches if self._is_cache_of_known_task(cache)]
+        if changed_caches:
+            self._apply_cache_changes(None, changed_caches, [])
+        return [cache.task_serial for cache in changed_caches]
+
+    def archive_tasks(self, selection: ArchiveSelection, max_workers: int = 4,
+                      policy: Optional[CompressionPolicy] = None) -> ArchiveBatch:
+        batch = self.create_archive_batch(self.select_tasks_to_archive(selection), max_workers, policy)
+        batch.run()
+        self.finish_archive_batch(batch)
+        return batch
+
+    def _is_cache_of_known_task(self, cache: TaskCache) -> bool:
+        task = self._tasks.get(cache.task_serial, None)
+        if task is None or task.get_rel_path() != cache.get_rel_path():
+            print(f'unknown task resource: {cache.get_rel_path()} (task_serial={cache.task_serial})')
+            return False
+        return True
+
+    def _apply_cache_changes(self, timestamp: Optional[datetime], changed_caches: List[TaskCache],
+                             removed_tasks: List[Task]) -> None:
+        """ timestamp: time of a complete scan of the tasks root or None """
+        cache_mgr = TaskCacheManager(self._tasks_root)
+        changed_caches = cache_mgr.select_caches(changed_caches)
+        try:
+            cache_mgr.write_changed_caches_to_db(timestamp, changed_caches=changed_caches,
+                                                 removed_task_serials=[task.serial for task in removed_tasks],
+                                                 db=self._db)
+
+            for task in removed_tasks:
+                task.set_cache(None, self._word_extractor)
+            changed_tasks = []
+            for cache in changed_caches:
+                task = self._tasks[cache.task_serial]
+                task.set_cache(cache.get_data(), self._word_extractor)
+                changed_tasks.append(task)
+
+            if timestamp is not None:
+                old_cache_timestamp = self._cache_timestamp
+                self._cache_timestamp = int(timestamp.timestamp())
+                self._cache_words_table.update_row({'cache_timestamp': self._cache_timestamp},
+                                                   where_str='cache_timestamp = ?',
+                                                   where_params=(old_cache_timestamp,))
+                self._write_fulltext_state()
+            self._write_cache_words(removed_tasks + changed_tasks)
+        except BaseException:
+            self._db.rollback()
+            raise
+        self._db.commit()
+
+    def _iter_tasks_by_resource_path(self) -> Iterator[Tuple[Path, Task]]:
+        for task in self._tasks.values():
+            task_path = task.get_path(self._tasks_root)
+            if task_path is not None:
+                yield task_path, task
+
+    def _check_caches(self, task_cache_list: List[TaskCache]) -> None:
         for cache in task_cache_list:
             cache_rel_path = cache.get_rel_path()
             if not cache.task_serial:
@@ -169,36 +501,30 @@ class TaskModel:
             if task_rel_path != cache_rel_path:
                 raise Exception(cache.task_serial, task_rel_path, cache_rel_path)  # todo: show error dialog
 
-        cache_mgr = TaskCacheManager(self._tasks_root)
-        task_caches = TaskCaches(
-            update_datetime=timestamp,
-            map={cache.task_serial: cache for cache in task_cache_list})
-        cache_mgr.write_caches_to_db(task_caches=task_caches, db=self._db)
-
-        # update task.cache
-        for task in self._tasks.values():
-            task.set_cache(None, self._word_extractor)
-        for cache in task_caches.map.values():
-            new_data = TaskCacheData(files_state=cache.files_state,
-                                     readme=cache.readme,
-                                     file_names=cache.file_names)
-            self._tasks[cache.task_serial].set_cache(new_data, self._word_extractor)
-
 
 class Task:
 
     def __init__(self, serial: int, revisions: List[TaskRevision], model: TaskModel):
+        """ revisions: sorted by rev_no, begins with the default revision (rev_no = 0)
+
+            If not all revisions are given (e.g. only the first and the last one),
+            the missing ones are read from the model on demand.
+        """
         assert len(revisions) > 0
-        for i, rev in enumerate(revisions):
-            assert rev.rev_no == i
+        assert revisions[0].rev_no == 0
+        self._all_revisions_loaded = len(revisions) == revisions[-1].rev_no + 1
+        if self._all_revisions_loaded:
+            for i, rev in enumerate(revisions):
+                assert rev.rev_no == i
 
         self._serial = serial
-        self._revisions = revisions
+        self._loaded_revisions: Dict[int, TaskRevision] = {rev.rev_no: rev for rev in revisions}
+        self._last_revision = revisions[-1]
 
         self._model = model
         self._cache = None
+        self._cache_version = 0  # incremented on each change of the cache, e.g. for render caches
         self._cache_words = set()
-        self._word_parts = set()
 
     @property
     def serial(self):
@@ -206,31 +532,44 @@ class Task:
 
     @property
     def last_revision(self):
-        return self._revisions[-1]
+        return self._last_revision
 
     @property
-    def revisions(self):
-        return self._revisions
+    def revisions(self) -> List[TaskRevision]:
+        if not self._all_revisions_loaded:
+            for rev in self._model.read_revisions_of_task(self._serial):
+                self._loaded_revisions.setdefault(rev.rev_no, rev)
+            self._all_revisions_loaded = True
+        return [self._loaded_revisions[rev_no] for rev_no in range(self._last_revision.rev_no + 1)]
 
     @property
     def cache(self):
         return self._cache
 
+    @property
+    def cache_version(self) -> int:
+        return self._cache_version
+
+    @property
+    def cache_words(self):
+        return self._cache_words
+
     @property
     def files_state(self):
         return self._cache.files_state if self._cache else TaskFilesState.NO_FILES
 
     def get_revision(self, rev_no: int) -> TaskRevision:
-        return self._revisions[rev_no]
+        task_rev = self._loaded_revisions.get(rev_no, None)
+        if task_rev is None:
+            task_rev = self.revisions[rev_no]
+        return task_rev
 
     def is_empty(self) -> bool:
-        n = len(self._revisions)
-        return n == 0 or n == 1 and self._revisions[0].rev_no == 0
+        return self._last_revision.rev_no == 0
 
     def get_header(self) -> str:
-        n = len(self._revisions)
-        rev_1st = self._revisions[1] if n >= 2 else self._revisions[0]
-        rev_last = self._revisions[-1]
+        rev_1st = self.get_revision(1 if self._last_revision.rev_no >= 1 else 0)
+        rev_last = self._last_revision
         return f'{rev_1st.date_str}: {rev_last.title}'
 
     def get_rgb(self) -> RGB:
@@ -238,7 +577,7 @@ class Task:
             return self._cache.files_state.rgb()
 
     def create_new_revision(self, date: str, title: str, body: str, category: str) -> TaskRevision:
-        new_rev_no = len(self._revisions)
+        new_rev_no = self._last_revision.rev_no + 1
         return TaskRevision(
             task_serial=self._serial,
             rev_no=new_rev_no,
@@ -251,8 +590,11 @@ class Task:
         )
 
     def add_revision(self, task_rev: TaskRevision) -> None:
-        assert len(self._revisions) == task_rev.rev_no
-        self._revisions.append(task_rev)
+        assert self._last_revision.rev_no + 1 == task_rev.rev_no
+        self._loaded_revisions[task_rev.rev_no] = task_rev
+        self._last_revision = task_rev
+        self._update_index_words()
+        self._model.invalidate_task_paths()  # the title or category may have changed
 
     def create_dir(self, tasks_root: Path) -> None:
         assert self._cache is None
@@ -263,6 +605,8 @@ class Task:
         self._cache = TaskCacheData(files_state=TaskFilesState.ACTIVE,
                                     readme='',
                                     file_names='')
+        self._cache_version += 1
+        self._model.invalidate_task_paths()
 
     def _create_meta_file(self, task_dpath: Path) -> None:
         meta_fpath = task_dpath / '.meta'
@@ -270,26 +614,6 @@ class Task:
         meta_data = {'task_serial': self.serial}
         yaml.safe_dump(meta_data, stream)
 
-    def zip_dir(self, tasks_root: Path) -> None:
-        assert self._cache is not None
-        assert self._cache.files_state == TaskFilesState.ACTIVE
-        task_dpath = tasks_root / self.get_rel_path()
-        assert task_dpath.exists()
-        zipper = Zipper(task_dpath)
-        zipper.start()
-        self._cache.files_state = TaskFilesState.PASSIVE
-        shutil.rmtree(task_dpath)
-
-    def unzip_file(self, tasks_root: Path) -> None:
-        assert self._cache is not None
-        assert self._cache.files_state == TaskFilesState.PASSIVE
-        zip_fpath = tasks_root / (self.get_rel_path() + '.zip')
-        assert zip_fpath.exists()
-        unzipper = Unzipper(zip_fpath)
-        unzipper.start()
-        self._cache.files_state = TaskFilesState.ACTIVE
-        zip_fpath.unlink()
-
     def get_path(self, tasks_root: Path) -> Optional[Path]:
         if self._cache:
             files_state = self._cache.files_state
@@ -300,10 +624,10 @@ class Task:
                 return tasks_root / (rel_path + '.zip')
 
     def get_date_str(self) -> str:
-        return self._revisions[1].date_str
+        return self.get_revision(1).date_str
 
     def get_rel_path(self) -> str:
-        assert not self._revisions[0].date_str
+        assert not self.get_revision(0).date_str
         task_last_rev = self.last_revision
         title_fname = self._get_title_fname(task_last_rev.title)
         return f'{task_last_rev.category}/{self.get_date_str()}-{title_fname}'
@@ -320,33 +644,32 @@ class Task:
         assert '--' not in title_fname
         return title_fname
 
-    def set_cache(self, cache_data: Optional[TaskCacheData], word_extractor: WordExtractor):
+    def set_cache(self, cache_data: Optional[TaskCacheData], word_extractor: WordExtractor,
+                  cache_words: Optional[Set[str]] = None):
         self._cache = cache_data
-        self._cache_words.clear()
-        if cache_data is not None:
+        self._cache_version += 1
+        self._model.invalidate_task_paths()
+        self._cache_words = set()
+        if cache_words is not None:
+            self._cache_words |= cache_words
+        elif cache_data is not None:
             if cache_data.readme:
                 self._cache_words |= word_extractor.get_words(cache_data.readme)
             if cache_data.file_names:
                 self._cache_words |= word_extractor.get_words(cache_data.file_names)
-        self._update_word_parts()
+        self._update_index_words()
 
-    def _update_word_parts(self) -> None:
+    def _update_index_words(self) -> None:
         words = self._cache_words | self.last_revision.words
-        self._word_parts = set(word[:n] for word in words for n in range(2, len(word) + 1))
+        self._model.word_index.set_task_words(self._serial, words)
 
-    def does_meet_the_criteria(self, search_words: Iterable[str],
-                               category: str, files_state: str) -> bool:
-        task_rev = self.last_revision
-
-        if category and category != task_rev.category:
+    def does_meet_the_filter(self, category: str, files_state: str) -> bool:
+        if category and category != self.last_revision.category:
             return False
         if files_state:
             if self.files_state.name.lower() != files_state:
                 return False
-        return self._contains_all_words(search_words)
-
-    def _contains_all_words(self, words: Iterable[str]) -> bool:
-        return set(words) <= self._word_parts
+        return True
 
 
 class TaskRevision:
@@ -364,7 +687,9 @@ class TaskRevision:
 
     def __init__(self, task_serial: int, rev_no: int,
                  date: str, category: str, title: str, body: str, group_serial: int,
-                 word_extractor: Optional[WordExtractor] = None):
+                 word_extractor: Optional[WordExtractor] = None, words: Optional[Set[str]] = None,
+                 lazy: bool = False):
+        """ lazy: body is parsed and words are extracted not until page or words are accessed """
         self._task_serial = task_serial
         self._rev_no = rev_no
         self._date_str = self._norm_date_str(date)
@@ -373,8 +698,23 @@ class TaskRevision:
         self._body = body
         self._group_serial = group_serial
 
-        self._page = read_from_xmlstr(body, contains_page_element=False)
-        self._words: Set[str] = set(self._iter_words(word_extractor)) if word_extractor else set()
+        self._word_extractor = word_extractor
+        self._page: Optional[Page] = None
+        self._words: Optional[Set[str]] = words
+        if not lazy:
+            self._parse_page()
+            self._extract_words()
+
+    def _parse_page(self) -> Page:
+        if self._page is None:
+            self._page = read_from_xmlstr(self._body, contains_page_element=False)
+        return self._page
+
+    def _extract_words(self) -> Set[str]:
+        if self._words is None:
+            word_extractor = self._word_extractor
+            self._words = set(self._iter_words(word_extractor)) if word_extractor else set()
+        return self._words
 
     @staticmethod
     def _norm_date_str(date_str) -> str:
@@ -385,10 +725,14 @@ class TaskRevision:
 
     def _iter_words(self, word_extractor: WordExtractor) -> Iterator[str]:
         yield from word_extractor.get_words(self._title)
-        for inline_elem in self._page.iter_inline_elements():
+        for inline_elem in self._parse_page().iter_inline_elements():
             if inline_elem.text:
                 yield from word_extractor.get_words(inline_elem.text)
 
+    def get_body_text(self) -> str:
+        return ' '.join(inline_elem.text for inline_elem in self._parse_page().iter_inline_elements()
+                        if inline_elem.text)
+
     @property
     def task_serial(self):
         return self._task_serial
@@ -410,16 +754,16 @@ class TaskRevision:
         return self._body
 
     @property
-    def page(self):
-        return self._page
+    def page(self) -> Page:
+        return self._parse_page()
 
     @property
     def category(self):
         return self._category
 
     @property
-    def words(self):
-        return self._words
+    def words(self) -> Set[str]:
+        return self._extract_words()
 
     def get_values(self):
         return {
@@ -439,6 +783,125 @@ class TaskRevision:
                self._group_serial != new_values['group_serial']
 
 
+def read_changed_caches(task_dirs: List[TaskDir], old_stamps: Dict[Path, ResourceStamp],
+                        reader: Optional[TaskResourceReader] = None) -> List[TaskCache]:
+    """ reads only the file system, so it can run in a worker thread """
+    if reader is None:
+        reader = TaskResourceReader()
+    return [cache for cache in reader.iter_read_changed(task_dirs, old_stamps)
+            if cache is not None]
+
+
+def read_refreshed_resources(tasks_root: Path, resource_paths: Optional[Set[Path]],
+                             old_stamps: Dict[Path, ResourceStamp]) -> Tuple[List[TaskCache], Set[Path]]:
+    """ reads only the file system, so it can run in a worker thread (see TaskModel.refresh_resources())
+
+        resource_paths: None => all resources, e.g. if the events of a watcher were lost
+        Returns the caches of the changed resources and the paths of the missing ones.
+    """
+    cache_mgr = TaskCacheManager(tasks_root)
+    if resource_paths is None:
+        resource_paths = set(old_stamps.keys())
+        resource_paths.update(task_resource.path for task_resource in cache_mgr.read_resources())
+    changed_caches = []
+    missing_paths = set()
+    for resource_path in resource_paths:
+        task_resource = cache_mgr.create_resource(resource_path)
+        if task_resource is None:
+            missing_paths.add(resource_path)
+            continue
+        try:
+            stamp = task_resource.read_stamp()
+            if old_stamps.get(resource_path, None) == stamp:
+                continue
+            changed_caches.append(task_resource.read(stamp))
+        except Exception as e:  # e.g. a task dir, which is still being written
+            print(f'cannot read {resource_path}: {e}')
+    return changed_caches, missing_paths
+
+
+def _join_words(words: Iterable[str]) -> str:
+    return ' '.join(sorted(words))
+
+
+def _split_words(words_str: str) -> Set[str]:
+    return set(words_str.split())
+
+
+class WordIndex:
+    """ inverted index: word -> serials of the tasks, which contains this word
+
+        The words are hold in a sorted vocabulary, so all words with a given prefix
+        can be found by a binary search.
+    """
+    MIN_PREFIX_LEN = 2
+
+    def __init__(self):
+        self._postings: Dict[str, Set[TaskSerial]] = {}
+        self._task_words: Dict[TaskSerial, Set[str]] = {}
+        self._sorted_words: List[str] = []
+        self._is_vocabulary_dirty = False
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._task_words.clear()
+        self._sorted_words = []
+        self._is_vocabulary_dirty = False
+
+    def set_task_words(self, task_serial: TaskSerial, words: Set[str]) -> None:
+        old_words = self._task_words.get(task_serial, set())
+        for word in old_words - words:
+            posting = self._postings[word]
+            posting.discard(task_serial)
+            if not posting:
+                del self._postings[word]
+                self._is_vocabulary_dirty = True
+        for word in words - old_words:
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = set()
+                self._is_vocabulary_dirty = True
+            posting.add(task_serial)
+        self._task_words[task_serial] = set(words)
+
+    def remove_task(self, task_serial: TaskSerial) -> None:
+        self.set_task_words(task_serial, set())
+        del self._task_words[task_serial]
+
+    def find_tasks(self, prefixes: Iterable[str]) -> Optional[Set[TaskSerial]]:
+        """ returns the serials of the tasks, which contains a word for each prefix
+
+            returns None, if there are no prefixes (=> all tasks match)
+        """
+        postings = [self.find_prefix(prefix) for prefix in set(prefixes)]
+        if not postings:
+            return None
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            if not result:
+                break
+            result &= posting
+        return result
+
+    def find_prefix(self, prefix: str) -> Set[TaskSerial]:
+        result = set()
+        if len(prefix) < self.MIN_PREFIX_LEN:
+            return result
+        sorted_words = self._get_sorted_words()
+        i = bisect_left(sorted_words, prefix)
+        while i < len(sorted_words) and sorted_words[i].startswith(prefix):
+            result |= self._postings[sorted_words[i]]
+            i += 1
+        return result
+
+    def _get_sorted_words(self) -> List[str]:
+        if self._is_vocabulary_dirty:
+            self._sorted_words = sorted(self._postings.keys())
+            self._is_vocabulary_dirty = False
+        return self._sorted_words
+
+
 class WordExtractor:
     _REX = re.compile(r"[a-zA-Z0-9äöüßÄÖÜ]+[a-zA-Z0-9äöüßÄÖÜ_\-]*[a-zA-Z0-9äöüßÄÖÜ]")
 
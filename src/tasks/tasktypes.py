@@ -15,10 +15,13 @@
 # You should have received a copy of the GNU General Public License
 # along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
 
+from typing import Any
+
 
 class BaseType:
 
-    def convert_to_db(self, value: str) -> str:
+    def convert_to_db(self, value: Any) -> Any:
+        """ converts value into a parameter for a sqlite3 statement (not into a sql literal) """
         return value
 
 
@@ -26,12 +29,13 @@ class Int(BaseType):
     sqlite3_typename = 'integer'
 
 
+class Float(BaseType):
+    sqlite3_typename = 'real'
+
+
 class String(BaseType):
     sqlite3_typename = 'text'  # !! Not 'string', otherwise '0123' will converted to '123' !!
-        
-    def convert_to_db(self, value: str) -> str:
-        return value.replace('"', '""')
-        
+
 
 class ID(BaseType):
     sqlite3_typename = 'integer primary key'
@@ -58,7 +62,7 @@ class StringList(BaseType):
     sqlite3_typename = 'text'
     
     def convert_to_db(self, value: str) -> str:
-        return value.replace('"', '""')  # besser ','.join(value)
+        return value  # besser ','.join(value)
     
 
 class XmlString(String):
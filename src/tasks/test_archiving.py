@@ -0,0 +1,106 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from tasks.archiving import ArchiveJob, ArchiveJobQueue, ArchiveAction
+from tasks.zipping import ArchiveCanceled
+
+
+class TestArchiveJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._root = Path(self._temp_dir.name)
+        self._task_dpaths = []
+        for i in range(3):
+            task_dpath = self._root / 'work' / f'20010{i}-task'
+            (task_dpath / 'docs').mkdir(parents=True)
+            (task_dpath / 'docs' / 'a.txt').write_text('a' * 100000)
+            self._task_dpaths.append(task_dpath)
+        self._finished = []
+        self._progress = []
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def _create_queue(self) -> ArchiveJobQueue:
+        return ArchiveJobQueue(on_progress=lambda job, done, total: self._progress.append((done, total)),
+                               on_finished=lambda job, error: self._finished.append((job.task_serial, error)))
+
+    def test_zip_and_unzip(self):
+        job_queue = self._create_queue()
+        for i, task_dpath in enumerate(self._task_dpaths):
+            self.assertTrue(job_queue.submit(ArchiveJob(i, ArchiveAction.ZIP, task_dpath)))
+        job_queue.wait()
+        self.assertEqual(self._finished, [(0, None), (1, None), (2, None)])
+        self.assertEqual(self._progress[-1], (100000, 100000))
+        for task_dpath in self._task_dpaths:
+            self.assertFalse(task_dpath.exists())
+            self.assertTrue(Path(str(task_dpath) + '.zip').exists())
+
+        job = ArchiveJob(0, ArchiveAction.UNZIP, Path(str(self._task_dpaths[0]) + '.zip'))
+        self.assertEqual(job.target_path, self._task_dpaths[0])
+        job_queue.submit(job)
+        job_queue.wait()
+        self.assertEqual((self._task_dpaths[0] / 'docs' / 'a.txt').read_text(), 'a' * 100000)
+        self.assertFalse(job.source_path.exists())
+
+    def test_cancel(self):
+        job_started = threading.Event()
+        continue_job = threading.Event()
+
+        def on_progress(job: ArchiveJob, done_size: int, total_size: int):
+            job_started.set()
+            continue_job.wait()
+
+        job_queue = ArchiveJobQueue(on_progress=on_progress,
+                                    on_finished=lambda job, error: self._finished.append((job.task_serial, error)))
+        job_queue.submit(ArchiveJob(0, ArchiveAction.ZIP, self._task_dpaths[0]))
+        job_queue.submit(ArchiveJob(1, ArchiveAction.ZIP, self._task_dpaths[1]))
+        self.assertFalse(job_queue.submit(ArchiveJob(1, ArchiveAction.ZIP, self._task_dpaths[1])))
+        job_started.wait()
+        job_queue.cancel_all()
+        continue_job.set()
+        job_queue.wait()
+
+        self.assertEqual([task_serial for task_serial, _ in self._finished], [0, 1])
+        for (_, error), task_dpath in zip(self._finished, self._task_dpaths):
+            self.assertIsInstance(error, ArchiveCanceled)
+            self.assertTrue(task_dpath.exists())
+            self.assertFalse(Path(str(task_dpath) + '.zip').exists())
+        self.assertEqual(job_queue.get_jobs(), [])
+
+    def test_register(self):
+        job_queue = ArchiveJobQueue()
+        batch_jobs = [ArchiveJob(i, ArchiveAction.ZIP, task_dpath) for i, task_dpath in enumerate(self._task_dpaths)]
+        self.assertTrue(job_queue.register(batch_jobs))
+        self.assertFalse(job_queue.submit(ArchiveJob(0, ArchiveAction.ZIP, self._task_dpaths[0])))
+        self.assertFalse(job_queue.register(batch_jobs[:1]))
+        job_queue.cancel(1)
+        self.assertTrue(batch_jobs[1].is_canceled)
+        job_queue.unregister(batch_jobs)
+        self.assertEqual(job_queue.get_jobs(), [])
+        self.assertTrue(job_queue.submit(ArchiveJob(0, ArchiveAction.ZIP, self._task_dpaths[0])))
+        job_queue.wait()
+
+
+if __name__ == '__main__':
+    unittest.main()
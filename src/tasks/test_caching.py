@@ -0,0 +1,94 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from tasks.caching import TaskDir, TaskZipFile, TaskFilesState, TaskCacheManager, TaskResourceReader
+from tasks.zipping import Zipper
+
+
+class TestTaskResources(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._root = Path(self._temp_dir.name)
+        self._task_dpath = self._root / 'work' / '200101-my-task'
+        (self._task_dpath / 'docs').mkdir(parents=True)
+        (self._task_dpath / 'docs' / 'a.txt').write_text('aaa')
+        (self._task_dpath / 'readme.txt').write_text('read me', encoding='utf-8')
+        (self._task_dpath / '.meta').write_text('task_serial: 17\n', encoding='utf-8')
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def _check_cache(self, cache, files_state: TaskFilesState):
+        self.assertEqual(cache.task_serial, 17)
+        self.assertEqual(cache.files_state, files_state)
+        self.assertEqual(cache.get_rel_path(), 'work/200101-my-task')
+        self.assertEqual(cache.readme, 'read me')
+        self.assertEqual(sorted(cache.file_names.split('\n')), ['  a.txt', '.meta', 'docs', 'readme.txt'])
+
+    def test_task_dir(self):
+        cache = TaskDir(self._task_dpath).read()
+        self._check_cache(cache, TaskFilesState.ACTIVE)
+
+    def test_task_zip_file(self):
+        Zipper(self._task_dpath).start()
+        cache = TaskZipFile(self._root / 'work' / '200101-my-task.zip').read()
+        self._check_cache(cache, TaskFilesState.PASSIVE)
+
+
+class TestTaskResourceReader(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._root = Path(self._temp_dir.name)
+        for i in range(20):
+            task_dpath = self._root / 'work' / f'2001{i:02}-task'
+            task_dpath.mkdir(parents=True)
+            (task_dpath / '.meta').write_text(f'task_serial: {i + 1}\n', encoding='utf-8')
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_read(self):
+        task_resources = TaskCacheManager(self._root).read_resources()
+        reader = TaskResourceReader(max_workers=4)
+        task_caches = list(reader.iter_read(task_resources))
+        self.assertEqual(sorted(cache.task_serial for cache in task_caches), list(range(1, 21)))
+
+    def test_read_changed_with_error(self):
+        task_resources = list(TaskCacheManager(self._root).read_resources())
+        task_resources.append(TaskDir(self._root / 'work' / '200199-removed-task'))
+        reader = TaskResourceReader(max_workers=4)
+        task_caches = [cache for cache in reader.iter_read_changed(task_resources, {}) if cache is not None]
+        self.assertEqual(sorted(cache.task_serial for cache in task_caches), list(range(1, 21)))
+
+    def test_cancel(self):
+        task_resources = TaskCacheManager(self._root).read_resources()
+        reader = TaskResourceReader(max_workers=1)
+        task_caches = []
+        for task_cache in reader.iter_read(task_resources):
+            task_caches.append(task_cache)
+            reader.cancel()
+        self.assertEqual(len(task_caches), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
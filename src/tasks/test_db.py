@@ -0,0 +1,104 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from tasks.db import DB, Row
+from tasks.metamodel import MetaModel
+
+_INI_STR = """
+[items]
+serial: Int()
+name: String()
+primary_key: PrimaryKey('serial')
+name_index: Index('name')
+"""
+
+
+class TestDB(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        temp_dpath = Path(self._temp_dir.name)
+        ini_path = temp_dpath / 'test.ini'
+        ini_path.write_text(_INI_STR, encoding='utf-8')
+        meta_model = MetaModel()
+        meta_model.read(ini_path)
+        self._sqlite_path = temp_dpath / 'test.sqlite'
+        self._meta_model = meta_model
+        self._db = DB(self._sqlite_path, meta_model)
+        self._db.create()
+        self._table = self._db.table('items')
+
+    def tearDown(self):
+        self._db.conn.close()
+        self._temp_dir.cleanup()
+
+    def _select_names(self):
+        return [row['name'] for row in self._table.select()]
+
+    def _select_index_names(self):
+        sql_cmd = "select name from sqlite_master where type = 'index' and tbl_name = 'items'"
+        return sorted(row['name'] for row in self._db.execute_sql(sql_cmd).fetchall())
+
+    def test_create_indexes(self):
+        self.assertEqual(self._select_index_names(), ['items_name_index', 'items_primary_key'])
+        self._table.insert_row(Row({'serial': 1, 'name': 'a'}, self._table))
+        with self.assertRaises(sqlite3.IntegrityError):
+            self._table.insert_row(Row({'serial': 1, 'name': 'b'}, self._table))
+
+    def test_open_adds_missing_indexes(self):
+        self._db.execute_sql('drop index items_name_index')
+        self._db.commit()
+        self._db.conn.close()
+        self._db = DB(self._sqlite_path, self._meta_model)
+        self._db.open()
+        self.assertEqual(self._select_index_names(), ['items_name_index', 'items_primary_key'])
+
+    def test_insert_quotes(self):
+        name = 'a "quoted" name with \'apostrophes\''
+        self._table.insert_row(Row({'serial': 1, 'name': name}, self._table))
+        self._db.commit()
+        self.assertEqual(self._select_names(), [name])
+
+    def test_value_like_column_name(self):
+        self._table.insert_row(Row({'serial': 1, 'name': 'x'}, self._table))
+        self._table.update_row({'name': 'serial'}, where_str='serial = ?', where_params=(1,))
+        self.assertEqual(self._select_names(), ['serial'])
+
+    def test_insert_many(self):
+        self._table.insert_many(Row({'serial': i, 'name': f'name{i}'}, self._table) for i in range(100))
+        self._db.commit()
+        rows = self._table.select(where_str='serial >= ?', where_params=(98,))
+        self.assertEqual([row['name'] for row in rows], ['name98', 'name99'])
+
+    def test_update_many(self):
+        self._table.insert_many(Row({'serial': i, 'name': ''}, self._table) for i in range(3))
+        self._table.update_many((({'name': f'new{i}'}, (i,)) for i in range(3)), where_str='serial = ?')
+        self.assertEqual(self._select_names(), ['new0', 'new1', 'new2'])
+
+    def test_delete_many(self):
+        self._table.insert_many(Row({'serial': i, 'name': ''}, self._table) for i in range(5))
+        self._table.delete_many('serial = ?', [(1,), (3,)])
+        self.assertEqual([row['serial'] for row in self._table.select()], [0, 2, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
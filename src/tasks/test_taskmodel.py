@@ -0,0 +1,353 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import List
+from zipfile import ZipFile
+
+from tasks.archiving import ArchiveSelection
+from tasks.caching import TaskCacheManager, TaskResourceReader, TaskFilesState
+from tasks.db import DB, Row
+from tasks.metamodel import MetaModel
+from tasks.taskmodel import TaskModel, TaskRevision, WordExtractor, WordIndex, read_changed_caches, \
+    read_refreshed_resources
+from tasks.zipindex import ZipMemberIndex, open_zipped_file
+from tasks.zipping import Zipper
+
+_ETC_DPATH = Path(__file__).resolve().parent.parent.parent / 'etc'
+
+
+class TestWordIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._index = WordIndex()
+        self._index.set_task_words(1, {'python', 'sqlite'})
+        self._index.set_task_words(2, {'pyside', 'gui'})
+        self._index.set_task_words(3, {'sqlite', 'gui'})
+
+    def test_no_prefixes(self):
+        self.assertIsNone(self._index.find_tasks([]))
+
+    def test_prefix(self):
+        self.assertEqual(self._index.find_tasks(['py']), {1, 2})
+        self.assertEqual(self._index.find_tasks(['sqlite']), {1, 3})
+
+    def test_several_prefixes(self):
+        self.assertEqual(self._index.find_tasks(['py', 'gu']), {2})
+        self.assertEqual(self._index.find_tasks(['py', 'xyz']), set())
+
+    def test_too_short_prefix(self):
+        self.assertEqual(self._index.find_tasks(['p']), set())
+
+    def test_update_task_words(self):
+        self._index.set_task_words(1, {'java'})
+        self.assertEqual(self._index.find_tasks(['py']), {2})
+        self.assertEqual(self._index.find_tasks(['ja']), {1})
+
+    def test_remove_task(self):
+        self._index.remove_task(3)
+        self.assertEqual(self._index.find_tasks(['gui']), {2})
+        self.assertEqual(self._index.find_tasks(['sq']), {1})
+
+
+class TestTaskModel(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._temp_dpath = Path(self._temp_dir.name)
+        no_keywords_path = self._temp_dpath / 'no-keywords.txt'
+        no_keywords_path.write_text('and\n', encoding='utf-8')
+        self._word_extractor = WordExtractor(no_keywords_path)
+        self._meta_model = MetaModel()
+        self._meta_model.read(_ETC_DPATH / 'tasks.ini')
+
+        db = self._create_db()
+        db.create()
+        misc_table = db.table('misc')
+        misc_table.insert_row(Row({'key': 'task_caches_timestamp', 'value': '0'}, misc_table))
+        db.commit()
+        db.conn.close()
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def _create_db(self) -> DB:
+        return DB(self._temp_dpath / 'tasks.sqlite', self._meta_model)
+
+    def _create_model(self, fulltext_enabled: bool = False) -> TaskModel:
+        model = TaskModel(self._create_db(), tasks_root=self._temp_dpath, word_extractor=self._word_extractor,
+                          fulltext_enabled=fulltext_enabled)
+        model.read()
+        return model
+
+    def _add_task(self, model: TaskModel, title: str, body: str) -> int:
+        task = model.create_new_task(task_serial=len(model.tasks) + 1)
+        task_rev = task.create_new_revision(date='200101', title=title, body=body, category='work')
+        model.add_task_revision(task_rev)
+        return task.serial
+
+    def test_search_new_task(self):
+        model = self._create_model()
+        serial = self._add_task(model, 'Python and SQLite', '<paragraph>some notes</paragraph>')
+        found_tasks = list(model.iter_filtered_tasks(['sql', 'no'], category='', files_state=''))
+        self.assertEqual([task.serial for task in found_tasks], [serial])
+
+    def test_persisted_words(self):
+        model = self._create_model()
+        self._add_task(model, 'Python and SQLite', '<paragraph>some notes</paragraph>')
+        model.db.conn.close()
+
+        model = self._create_model()
+        rows = model.db.table('task_revision_words').select()
+        self.assertEqual([row['words'] for row in rows], ['notes python some sqlite'])
+        task = model.get_task(1)
+        self.assertEqual(task.last_revision.words, {'notes', 'python', 'some', 'sqlite'})
+
+    def test_fulltext_search(self):
+        model = self._create_model(fulltext_enabled=True)
+        self._add_task(model, 'Python notes', '<paragraph>sqlite sqlite sqlite</paragraph>')
+        self._add_task(model, 'SQLite notes', '<paragraph>other</paragraph>')
+        self._add_task(model, 'Java notes', '')
+        model.db.conn.close()
+
+        model = self._create_model(fulltext_enabled=True)
+        found_tasks = list(model.iter_ranked_tasks(['sql', 'not'], category='', files_state=''))
+        self.assertEqual(set(task.serial for task in found_tasks), {1, 2})
+
+    def test_fulltext_ranking(self):
+        model = self._create_model(fulltext_enabled=True)
+        self._add_task(model, 'Java notes', '<paragraph>' + 'some other words, ' * 20 + 'sqlite</paragraph>')
+        self._add_task(model, 'SQLite notes', '<paragraph>sqlite sqlite sqlite</paragraph>')
+        found_tasks = list(model.iter_ranked_tasks(['sqlite'], category='', files_state=''))
+        self.assertEqual([task.serial for task in found_tasks], [2, 1])
+
+    def test_fulltext_empty_search(self):
+        model = self._create_model(fulltext_enabled=True)
+        self._add_task(model, 'Python notes', '')
+        self._add_task(model, 'SQLite notes', '')
+        found_tasks = list(model.iter_ranked_tasks([], category='', files_state=''))
+        self.assertEqual(sorted(task.serial for task in found_tasks), [1, 2])
+
+    def test_stale_fulltext_index(self):
+        model = self._create_model(fulltext_enabled=True)
+        serial = self._add_task(model, 'Java notes', '')
+        # a new revision written without updating the fulltext index (e.g. by an older version)
+        task_rev = model.get_task(serial).create_new_revision(date='200102', title='Rust notes', body='',
+                                                              category='work')
+        table = model.db.table('tasks_revisions')
+        task_rev_values = task_rev.get_values()
+        table.insert_row(Row(table=table, values={attr.name: task_rev_values[attr.name] for attr in table.attributes}))
+        model.db.commit()
+        model.db.conn.close()
+
+        model = self._create_model(fulltext_enabled=True)
+        self.assertEqual([task.serial for task in model.iter_ranked_tasks(['rust'], category='', files_state='')],
+                         [serial])
+
+    def _refresh_caches(self, model: TaskModel) -> int:
+        task_resources = TaskCacheManager(self._temp_dpath).read_resources()
+        reader = TaskResourceReader()
+        changed_caches = [task_cache for task_cache
+                          in reader.iter_read_changed(task_resources, model.get_resource_stamps())
+                          if task_cache is not None]
+        found_paths = set(task_resource.path for task_resource in task_resources)
+        model.update_cache_incremental(datetime.now(), changed_caches, found_paths)
+        return len(changed_caches)
+
+    def _find_serials(self, model: TaskModel, search_words: List[str]) -> List[int]:
+        return [task.serial for task in model.iter_filtered_tasks(search_words, category='', files_state='')]
+
+    def test_incremental_cache_update(self):
+        model = self._create_model()
+        serial = self._add_task(model, 'first', '')
+        task_dpath = self._temp_dpath / 'work' / '200101-first'
+        task_dpath.mkdir(parents=True)
+        (task_dpath / '.meta').write_text(f'task_serial: {serial}\n', encoding='utf-8')
+        (task_dpath / 'readme.txt').write_text('hello', encoding='utf-8')
+
+        self.assertEqual(self._refresh_caches(model), 1)
+        self.assertEqual(self._find_serials(model, ['hello']), [serial])
+        self.assertEqual(self._refresh_caches(model), 0)
+
+        (task_dpath / 'readme.txt').write_text('hello world', encoding='utf-8')
+        self.assertEqual(self._refresh_caches(model), 1)
+        self.assertEqual(self._find_serials(model, ['world']), [serial])
+        model.db.conn.close()
+
+        model = self._create_model()
+        self.assertEqual(self._find_serials(model, ['world']), [serial])
+        shutil.rmtree(task_dpath)
+        self.assertEqual(self._refresh_caches(model), 0)
+        self.assertIsNone(model.get_task(serial).cache)
+        self.assertEqual(self._find_serials(model, ['world']), [])
+
+    def test_task_dir_and_zip_file(self):
+        model = self._create_model()
+        serial = self._add_task(model, 'first', '')
+        task_dpath = self._temp_dpath / 'work' / '200101-first'
+        task_dpath.mkdir(parents=True)
+        (task_dpath / '.meta').write_text(f'task_serial: {serial}\n', encoding='utf-8')
+        Zipper(task_dpath).start()  # the task dir is removed after the zip file was written
+
+        self.assertEqual(self._refresh_caches(model), 2)
+        self.assertEqual(model.get_task(serial).files_state, TaskFilesState.ACTIVE)
+        model.db.conn.close()
+
+        model = self._create_model()
+        self.assertEqual(model.get_task(serial).files_state, TaskFilesState.ACTIVE)
+
+    def test_update_active_task_caches(self):
+        model = self._create_model()
+        serial = self._add_task(model, 'first', '')
+        task_dpath = self._temp_dpath / 'work' / '200101-first'
+        task_dpath.mkdir(parents=True)
+        (task_dpath / '.meta').write_text(f'task_serial: {serial}\n', encoding='utf-8')
+        self._refresh_caches(model)
+
+        (task_dpath / 'readme.txt').write_text('hello', encoding='utf-8')
+        task_dirs, old_stamps = model.get_active_task_dirs()
+        self.assertEqual([task_dir.path for task_dir in task_dirs], [task_dpath])
+        changed_caches = read_changed_caches(task_dirs, old_stamps)
+        self.assertEqual(model.update_active_task_caches(changed_caches), [serial])
+        self.assertEqual(self._find_serials(model, ['hello']), [serial])
+        model.db.conn.close()
+
+        model = self._create_model()
+        self.assertEqual(model.get_task(serial).cache.readme, 'hello')
+        task_dirs, old_stamps = model.get_active_task_dirs()
+        self.assertEqual(read_changed_caches(task_dirs, old_stamps), [])
+
+    def test_refresh_resources(self):
+        model = self._create_model()
+        serial = self._add_task(model, 'first', '')
+        task_dpath = self._temp_dpath / 'work' / '200101-first'
+        task_dpath.mkdir(parents=True)
+        (task_dpath / '.meta').write_text(f'task_serial: {serial}\n', encoding='utf-8')
+        self.assertEqual(model.refresh_resources([task_dpath]), [serial])
+        self.assertEqual(model.get_task(serial).files_state, TaskFilesState.ACTIVE)
+        cache_version = model.get_task(serial).cache_version
+        self.assertEqual(model.refresh_resources([task_dpath]), [])
+        self.assertEqual(model.get_task(serial).cache_version, cache_version)
+
+        zip_fpath = self._temp_dpath / 'work' / '200101-first.zip'
+        self.assertIsNone(model.find_zip_member(zip_fpath, '.meta'))
+        Zipper(task_dpath).start()
+        shutil.rmtree(task_dpath)
+        self.assertEqual(model.refresh_resources([task_dpath, zip_fpath]), [serial])
+        self.assertEqual(model.get_task(serial).files_state, TaskFilesState.PASSIVE)
+        self.assertGreater(model.get_task(serial).cache_version, cache_version)
+
+        members = ZipMemberIndex(model.db).get_members(serial)
+        self.assertEqual(sorted(member.name for member in members), ['.meta'])
+        self.assertEqual(model.find_zip_member(zip_fpath, '.meta'), members[0])
+        with open_zipped_file(zip_fpath, '.meta', members[0]) as stream:
+            self.assertEqual(stream.read(), f'task_serial: {serial}\n'.encode())
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # duplicate name
+            with ZipFile(zip_fpath, 'a') as zip_file:
+                zip_file.writestr('.meta', f'task_serial: {serial}\nappended: true\n')
+        self.assertEqual(model.refresh_resources([zip_fpath]), [serial])
+        members = ZipMemberIndex(model.db).get_members(serial)
+        self.assertEqual([member.name for member in members], ['.meta'])
+        with open_zipped_file(zip_fpath, '.meta', members[0]) as stream:
+            self.assertEqual(stream.read(), f'task_serial: {serial}\nappended: true\n'.encode())
+
+        zip_fpath.unlink()
+        self.assertEqual(model.refresh_resources([zip_fpath]), [serial])
+        self.assertIsNone(model.get_task(serial).cache)
+        self.assertEqual(ZipMemberIndex(model.db).get_members(serial), [])
+
+    def test_read_all_refreshed_resources(self):
+        model = self._create_model()
+        serial = self._add_task(model, 'first', '')
+        task_dpath = self._temp_dpath / 'work' / '200101-first'
+        task_dpath.mkdir(parents=True)
+        (task_dpath / '.meta').write_text(f'task_serial: {serial}\n', encoding='utf-8')
+        changed_caches, missing_paths = read_refreshed_resources(self._temp_dpath, None, model.get_resource_stamps())
+        self.assertEqual(model.apply_refreshed_resources(changed_caches, missing_paths), [serial])
+        self.assertEqual(read_refreshed_resources(self._temp_dpath, None, model.get_resource_stamps()), ([], set()))
+
+    def test_archive_tasks(self):
+        model = self._create_model()
+        task_dpaths = []
+        for title in ['old', 'new', 'big']:
+            serial = self._add_task(model, title, '')
+            task_dpath = self._temp_dpath / 'work' / f'200101-{title}'
+            task_dpath.mkdir(parents=True)
+            (task_dpath / '.meta').write_text(f'task_serial: {serial}\n', encoding='utf-8')
+            (task_dpath / 'a.txt').write_text('a' * (10000 if title == 'big' else 10))
+            if title != 'new':
+                for path in [task_dpath / 'a.txt', task_dpath / '.meta', task_dpath]:
+                    os.utime(path, (1000000000, 1000000000))
+            task_dpaths.append(task_dpath)
+        model.refresh_resources(task_dpaths)
+
+        selection = ArchiveSelection(min_age_days=30, min_size=1000)
+        self.assertEqual([task.serial for task in model.select_tasks_to_archive(selection)], [3])
+        selection = ArchiveSelection(min_age_days=30, categories={'work'})
+        batch = model.archive_tasks(selection, max_workers=2)
+        self.assertEqual(batch.errors, {})
+        self.assertEqual(sorted(cache.task_serial for cache in batch.caches), [1, 3])
+        model.db.conn.close()
+
+        model = self._create_model()
+        self.assertEqual([model.get_task(serial).files_state for serial in [1, 2, 3]],
+                         [TaskFilesState.PASSIVE, TaskFilesState.ACTIVE, TaskFilesState.PASSIVE])
+        self.assertFalse(task_dpaths[0].exists())
+        self.assertEqual(model.select_tasks_to_archive(selection), [])
+
+    def test_read_history_on_demand(self):
+        model = self._create_model()
+        serial = self._add_task(model, 'first', '')
+        task = model.get_task(serial)
+        for title in ['second', 'third']:
+            model.add_task_revision(task.create_new_revision(date='200102', title=title, body='', category='work'))
+        model.db.conn.close()
+
+        model = self._create_model()
+        task = model.get_task(serial)
+        self.assertEqual(task.get_header(), '200101: third')
+        self.assertEqual([rev.title for rev in task.revisions], ['', 'first', 'second', 'third'])
+        self.assertEqual(task.get_revision(2).title, 'second')
+
+
+class TestTaskRevision(unittest.TestCase):
+
+    def test_lazy_revision(self):
+        task_rev = TaskRevision(task_serial=1, rev_no=1, date='200101', category='work', title='title',
+                                body='<paragraph>unclosed', group_serial=0, lazy=True)
+        self.assertEqual(task_rev.title, 'title')
+        with self.assertRaises(Exception):
+            _ = task_rev.page
+
+    def test_lazy_revision_with_words(self):
+        task_rev = TaskRevision(task_serial=1, rev_no=1, date='200101', category='work', title='title',
+                                body='<paragraph>aaa bbb</paragraph>', group_serial=0,
+                                words={'xxx'}, lazy=True)
+        self.assertEqual(task_rev.words, {'xxx'})
+        self.assertEqual(len(task_rev.page.block_elements), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
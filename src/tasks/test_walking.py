@@ -0,0 +1,59 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from tasks.walking import walk
+
+
+class TestWalk(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._root = Path(self._temp_dir.name)
+        (self._root / 'a' / 'b').mkdir(parents=True)
+        (self._root / 'a' / 'b' / 'x.txt').write_text('xx')
+        (self._root / 'a' / 'y.txt').write_text('yyy')
+        (self._root / 'c').mkdir()
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_levels_and_order(self):
+        entries = [(entry.level, entry.name) for entry in walk(self._root)]
+        self.assertEqual(sorted(entries), [(0, 'a'), (0, 'c'), (1, 'b'), (1, 'y.txt'), (2, 'x.txt')])
+        names = [entry.name for entry in walk(self._root)]
+        self.assertLess(names.index('a'), names.index('b'))
+        self.assertLess(names.index('b'), names.index('x.txt'))
+
+    def test_stat(self):
+        entries = {entry.name: entry for entry in walk(self._root, with_stat=True)}
+        self.assertEqual(entries['x.txt'].size, 2)
+        self.assertEqual(entries['y.txt'].size, 3)
+        self.assertTrue(entries['b'].is_dir)
+        self.assertGreater(entries['b'].mtime, 0.0)
+        self.assertEqual(walk(self._root).__next__().size, -1)
+
+    def test_descend(self):
+        names = [entry.name for entry in walk(self._root, descend=lambda entry: entry.name != 'b')]
+        self.assertEqual(sorted(names), ['a', 'b', 'c', 'y.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from tasks.watching import PollingWatcher, InotifyWatcher, TasksRootWatcher
+from tasks.zipping import Zipper
+
+
+class _WatcherTestMixin:
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._root = Path(self._temp_dir.name)
+        self._task_dpath = self._root / 'work' / '200101-my-task'
+        self._task_dpath.mkdir(parents=True)
+        self._watcher = self._create_watcher()
+
+    def tearDown(self):
+        self._watcher.close()
+        self._temp_dir.cleanup()
+
+    def _create_watcher(self) -> TasksRootWatcher:
+        raise NotImplementedError()
+
+    def test_no_changes(self):
+        self.assertEqual(self._watcher.poll(), set())
+
+    def test_new_task_dir(self):
+        new_dpath = self._root / 'work' / '200102-new-task'
+        (new_dpath / 'docs').mkdir(parents=True)
+        self.assertEqual(self._watcher.poll(), {new_dpath})
+
+    def test_zip_task_dir(self):
+        (self._task_dpath / 'a.txt').write_text('a')
+        self._watcher.poll()
+        Zipper(self._task_dpath).start()
+        for path in sorted(self._task_dpath.iterdir()):
+            path.unlink()
+        self._task_dpath.rmdir()
+        zip_fpath = self._root / 'work' / '200101-my-task.zip'
+        self.assertEqual(self._watcher.poll(), {self._task_dpath, zip_fpath})
+
+    def test_rename_file_in_sub_dir(self):
+        sub_dpath = self._task_dpath / 'docs'
+        sub_dpath.mkdir()
+        (sub_dpath / 'a.txt').write_text('a')
+        self._watcher.poll()
+        os.rename(sub_dpath / 'a.txt', sub_dpath / 'b.txt')
+        self.assertEqual(self._watcher.poll(), {self._task_dpath})
+
+
+class TestPollingWatcher(_WatcherTestMixin, unittest.TestCase):
+
+    def _create_watcher(self) -> TasksRootWatcher:
+        return PollingWatcher(self._root)
+
+    def test_rename_file_in_sub_dir(self):
+        sub_dpath = self._task_dpath / 'docs'
+        sub_dpath.mkdir()
+        self._watcher.poll()
+        os.utime(sub_dpath, (1000000000, 1000000000))
+        self.assertEqual(self._watcher.poll(), set())  # the task dirs aren't descended into
+        os.utime(self._task_dpath, (1000000000, 1000000000))  # mtime resolution of some file systems is too coarse
+        self.assertEqual(self._watcher.poll(), {self._task_dpath})
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is only available on Linux')
+class TestInotifyWatcher(_WatcherTestMixin, unittest.TestCase):
+
+    def _create_watcher(self) -> TasksRootWatcher:
+        return InotifyWatcher(self._root)
+
+    def test_moved_task_dir(self):
+        moved_dpath = self._root / 'work' / '200101-moved-task'
+        os.rename(self._task_dpath, moved_dpath)
+        self.assertEqual(self._watcher.poll(), {self._task_dpath, moved_dpath})
+        (moved_dpath / 'a.txt').write_text('a')
+        self.assertEqual(self._watcher.poll(), {moved_dpath})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import tempfile
+import unittest
+from dataclasses import replace
+from pathlib import Path
+from unittest import mock
+from zipfile import ZipFile, BadZipFile, ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA
+
+from tasks.zipindex import read_zip_members, open_zipped_file, _can_open_indexed
+
+
+class TestOpenZippedFile(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._zip_fpath = Path(self._temp_dir.name) / '200101-task.zip'
+        with ZipFile(self._zip_fpath, 'w') as zip_file:
+            for compress_type in [ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA]:
+                zip_file.writestr(f'dir/{compress_type}.txt', f'text {compress_type}\n' * 100,
+                                  compress_type=compress_type)
+        with ZipFile(self._zip_fpath, 'r') as zip_file:
+            self._members = read_zip_members(zip_file)
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_read(self):
+        self.assertEqual(len(self._members), 4)
+        with ZipFile(self._zip_fpath, 'r') as zip_file:
+            for member in self._members:
+                with open_zipped_file(self._zip_fpath, member.name, member) as stream:
+                    self.assertEqual(stream.read(), zip_file.read(member.name))
+
+    def test_bad_crc(self):
+        member = replace(self._members[0], crc=self._members[0].crc ^ 1)
+        with self.assertRaises(BadZipFile):
+            with open_zipped_file(self._zip_fpath, member.name, member) as stream:
+                stream.read()
+
+    def test_bad_offset(self):
+        member = replace(self._members[1], header_offset=self._members[1].header_offset + 1)
+        with self.assertRaises(BadZipFile):
+            with open_zipped_file(self._zip_fpath, member.name, member) as stream:
+                stream.read()
+
+    def test_open(self):
+        with ZipFile(self._zip_fpath, 'r') as zip_file:
+            for member in self._members:
+                data = zip_file.read(member.name)
+                for indexed_member in [member, None]:
+                    with open_zipped_file(self._zip_fpath, member.name, indexed_member) as stream:
+                        self.assertEqual(stream.read(10), data[:10])
+                        self.assertEqual(stream.read(), data[10:])
+
+    def test_zipfile_internals(self):
+        # fails after an interpreter upgrade, which would silently switch off the indexed reading
+        self.assertTrue(_can_open_indexed())
+        with mock.patch('tasks.zipindex._CAN_OPEN_INDEXED', False):
+            member = replace(self._members[0], header_offset=self._members[0].header_offset + 1)
+            with open_zipped_file(self._zip_fpath, member.name, member) as stream:
+                self.assertEqual(stream.read(), f'text {ZIP_STORED}\n'.encode() * 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+from pathlib import Path
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED, ZIP_LZMA
+
+from tasks.zipping import Zipper, Unzipper, CompressionPolicy, _can_write_compressed
+
+
+class TestZipper(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._task_dpath = Path(self._temp_dir.name) / '200101-my-task'
+        (self._task_dpath / 'docs').mkdir(parents=True)
+        self._zip_fpath = Path(str(self._task_dpath) + '.zip')
+        self._big_fpath = self._task_dpath / 'docs' / 'big.bin'
+        with self._big_fpath.open('wb') as fh:
+            for i in range(16):
+                fh.write(os.urandom(1024 * 1024))
+        os.utime(self._big_fpath, (1000000000, 1000000000))
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_round_trip(self):
+        data = self._big_fpath.read_bytes()
+        tracemalloc.start()
+        Zipper(self._task_dpath).start()
+        _, peak_size = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertLess(peak_size, 4 * Zipper.CHUNK_SIZE)
+        self._check_unzipped(data)
+
+    def test_parallel(self):
+        for i in range(20):
+            (self._task_dpath / f'{i}.txt').write_text(f'text {i}\n' * i)
+        data = self._big_fpath.read_bytes()
+        _SmallMemoryZipper(self._task_dpath, max_workers=3).start()
+        with ZipFile(self._zip_fpath) as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(zip_file.read('5.txt'), b'text 5\n' * 5)
+            self.assertIn('docs/', zip_file.namelist())
+        self._check_unzipped(data)
+
+    def test_zipfile_internals(self):
+        # fails after an interpreter upgrade, which would silently switch off the process-pool mode
+        with ZipFile(self._zip_fpath, 'w') as zip_file:
+            self.assertTrue(_can_write_compressed(zip_file))
+
+    def test_parallel_zip64(self):
+        # zip64 structures are written for members above ZIP64_LIMIT, a lower limit avoids 4 GiB test files
+        data = self._big_fpath.read_bytes()
+        with mock.patch('zipfile.ZIP64_LIMIT', 1024 * 1024):
+            Zipper(self._task_dpath, max_workers=2).start()
+            with ZipFile(self._zip_fpath) as zip_file:
+                self.assertIsNone(zip_file.testzip())
+        with ZipFile(self._zip_fpath) as zip_file:
+            zip_info = zip_file.getinfo('docs/big.bin')
+            self.assertEqual(zip_info.extra[:2], b'\x01\x00')  # zip64 extra field
+            self.assertIsNone(zip_file.testzip())
+        self._check_unzipped(data)
+
+    def _check_unzipped(self, data: bytes):
+        shutil.rmtree(self._task_dpath)
+        Unzipper(self._zip_fpath).start()
+        self.assertEqual(self._big_fpath.read_bytes(), data)
+        self.assertEqual(self._big_fpath.stat().st_mtime, 1000000000)
+
+    def test_policy(self):
+        self._big_fpath.unlink()  # lzma is slow
+        (self._task_dpath / 'photo.JPG').write_bytes(b'jpg' * 1000)
+        (self._task_dpath / 'notes.txt').write_text('notes\n' * 1000)
+        policy = CompressionPolicy(compression=ZIP_LZMA)
+        for max_workers in [1, 2]:
+            Zipper(self._task_dpath, max_workers=max_workers, policy=policy).start()
+            with ZipFile(self._zip_fpath) as zip_file:
+                self.assertIsNone(zip_file.testzip())
+                self.assertEqual(zip_file.getinfo('photo.JPG').compress_type, ZIP_STORED)
+                self.assertEqual(zip_file.getinfo('notes.txt').compress_type, ZIP_LZMA)
+                self.assertEqual(zip_file.getinfo('notes.txt').flag_bits & 0x02, 0x02)
+                self.assertEqual(zip_file.getinfo('photo.JPG').flag_bits & 0x02, 0)
+                self.assertEqual(zip_file.read('notes.txt'), b'notes\n' * 1000)
+            self._zip_fpath.unlink()
+
+
+class TestCompressionPolicy(unittest.TestCase):
+
+    def test_get_compression(self):
+        policy = CompressionPolicy(default_level=1, size_levels=[(1000, 9), (10000, 6)])
+        self.assertEqual(policy.get_compression('a.txt', 1000), (ZIP_DEFLATED, 9))
+        self.assertEqual(policy.get_compression('a.txt', 1001), (ZIP_DEFLATED, 6))
+        self.assertEqual(policy.get_compression('a.txt', 10001), (ZIP_DEFLATED, 1))
+        self.assertEqual(policy.get_compression('a.Zip', 10), (ZIP_STORED, None))
+
+
+class _SmallMemoryZipper(Zipper):
+    MAX_IN_MEMORY_SIZE = 1024 * 1024
+
+
+if __name__ == '__main__':
+    unittest.main()
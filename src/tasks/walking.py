@@ -0,0 +1,63 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Callable, Optional, Union
+
+
+@dataclass
+class WalkEntry:
+    """ one file or directory; size and mtime are only set, if the walk was started with with_stat=True """
+    level: int
+    name: str
+    path: str
+    is_dir: bool
+    size: int = -1
+    mtime: float = 0.0
+
+
+DescendFilter = Callable[[WalkEntry], bool]
+
+
+def walk(dpath: Union[Path, str], descend: Optional[DescendFilter] = None,
+         with_stat: bool = False) -> Iterator[WalkEntry]:
+    """ yields the entries below dpath in directory order, each directory followed by its content
+
+        Uses os.scandir(), so the type of an entry is known without an extra stat() call
+        (on most file systems). descend: decides, whether the content of a directory is walked.
+    """
+    yield from _walk_recursive(os.fspath(dpath), 0, descend, with_stat)
+
+
+def _walk_recursive(dpath: str, level: int, descend: Optional[DescendFilter],
+                    with_stat: bool) -> Iterator[WalkEntry]:
+    with os.scandir(dpath) as dir_iter:
+        dir_entries = list(dir_iter)  # closes the directory handle before descending
+    for dir_entry in dir_entries:
+        entry = WalkEntry(level=level, name=dir_entry.name, path=dir_entry.path, is_dir=dir_entry.is_dir())
+        if with_stat:
+            entry_stat = dir_entry.stat()
+            entry.mtime = entry_stat.st_mtime
+            if not entry.is_dir:
+                entry.size = entry_stat.st_size
+        yield entry
+        if entry.is_dir and (descend is None or descend(entry)):
+            yield from _walk_recursive(entry.path, level + 1, descend, with_stat)
@@ -0,0 +1,209 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+""" watchers for the tasks root, which report the paths of changed task dirs and task zip files
+
+    InotifyWatcher uses the Linux inotify API (via ctypes), PollingWatcher compares the mtimes
+    of the task dirs and zip files (changes of file contents and of sub dirs in task dirs are not
+    detected by polling, but new, renamed, deleted, zipped and unzipped tasks and files are).
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Optional, Set, Dict, Tuple, Iterator
+
+from tasks.caching import TaskCacheManager
+from tasks.walking import walk
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+WATCH_MODES = ('off', 'auto', 'polling')
+
+
+class TasksRootWatcher:
+
+    def __init__(self, root: Path):
+        self._root = root
+        self._cache_mgr = TaskCacheManager(root)
+
+    def poll(self) -> Optional[Set[Path]]:
+        """ returns the paths of the task resources, which were changed since the last call,
+            or None, if changes were lost (then all resources must be checked)
+
+            Doesn't block, so it can be called by a timer.
+        """
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher(TasksRootWatcher):
+    """ watches all directories below the tasks root (incl. the content of the task dirs) """
+
+    def __init__(self, root: Path):
+        super().__init__(root)
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise _create_os_error('inotify_init1')
+        self._paths_by_wd: Dict[int, Path] = {}
+        try:
+            self._add_watches(root)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def poll(self) -> Optional[Set[Path]]:
+        resource_paths = set()
+        changes_lost = False
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            for wd, mask, name in _iter_events(buf):
+                if mask & IN_Q_OVERFLOW:
+                    changes_lost = True
+                elif mask & IN_IGNORED:
+                    self._paths_by_wd.pop(wd, None)
+                elif wd in self._paths_by_wd:
+                    path = self._paths_by_wd[wd] / name if name else self._paths_by_wd[wd]
+                    self._update_watches(path, mask)
+                    resource_path = self._cache_mgr.find_resource_path(path)
+                    if resource_path is not None:
+                        resource_paths.add(resource_path)
+        return None if changes_lost else resource_paths
+
+    def _update_watches(self, path: Path, mask: int) -> None:
+        if mask & IN_ISDIR:
+            if mask & IN_MOVED_FROM:
+                self._forget_watches(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._add_watches(path)
+                except FileNotFoundError:
+                    pass  # already removed again
+
+    def _add_watches(self, dpath: Path) -> None:
+        self._add_watch(dpath)
+        for entry in walk(dpath):
+            if entry.is_dir:
+                self._add_watch(Path(entry.path))
+
+    def _add_watch(self, dpath: Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dpath), _WATCH_MASK)
+        if wd < 0:
+            raise _create_os_error('inotify_add_watch', dpath)
+        self._paths_by_wd[wd] = dpath  # a moved directory keeps its wd
+
+    def _forget_watches(self, dpath: Path) -> None:
+        """ the kernel keeps the watches of a moved directory, they are mapped again at IN_MOVED_TO """
+        for wd, path in list(self._paths_by_wd.items()):
+            if path == dpath or dpath in path.parents:
+                del self._paths_by_wd[wd]
+
+
+class PollingWatcher(TasksRootWatcher):
+
+    def __init__(self, root: Path):
+        super().__init__(root)
+        self._snapshot = self._take_snapshot()
+
+    def poll(self) -> Optional[Set[Path]]:
+        try:
+            new_snapshot = self._take_snapshot()
+        except FileNotFoundError:
+            return set()  # the tree was changed while walking, try again next time
+        changed_paths = set(new_snapshot.keys()) ^ set(self._snapshot.keys())
+        changed_paths.update(path for path, stamp in new_snapshot.items()
+                             if path in self._snapshot and self._snapshot[path] != stamp)
+        self._snapshot = new_snapshot
+
+        resource_paths = set()
+        for path in changed_paths:
+            resource_path = self._cache_mgr.find_resource_path(Path(path))
+            if resource_path is not None:
+                resource_paths.add(resource_path)
+        return resource_paths
+
+    def _take_snapshot(self) -> Dict[str, Tuple[float, int]]:
+        """ returns the mtime and size of the directories and zip files down to the task dirs
+
+            A changed task dir is detected by its own mtime, so the task dirs aren't descended into.
+        """
+        return {entry.path: (entry.mtime, entry.size)
+                for entry in walk(self._root, descend=self._cache_mgr.is_no_task_dir, with_stat=True)
+                if entry.is_dir or entry.name.endswith('.zip')}
+
+
+def create_watcher(root: Path, mode: str) -> Optional[TasksRootWatcher]:
+    """ mode: 'off', 'auto' (inotify, if available, else polling) or 'polling' """
+    assert mode in WATCH_MODES, mode
+    if mode == 'off':
+        return None
+    if mode == 'auto' and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:  # e.g. too many watches (see fs.inotify.max_user_watches)
+            print(f'inotify not available ({e}), polling the tasks root')
+    return PollingWatcher(root)
+
+
+def _load_libc() -> ctypes.CDLL:
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def _create_os_error(func_name: str, path: Optional[Path] = None) -> OSError:
+    errno = ctypes.get_errno()
+    return OSError(errno, f'{func_name}: {os.strerror(errno)}', str(path) if path else None)
+
+
+def _iter_events(buf: bytes) -> Iterator[Tuple[int, int, str]]:
+    """ yields wd, mask and name of the inotify events in buf """
+    pos = 0
+    while pos + _EVENT_HEADER.size <= len(buf):
+        wd, mask, cookie, name_len = _EVENT_HEADER.unpack_from(buf, pos)
+        pos += _EVENT_HEADER.size
+        name = os.fsdecode(buf[pos:pos + name_len].rstrip(b'\0'))
+        pos += name_len
+        yield wd, mask, name
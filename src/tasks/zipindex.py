@@ -0,0 +1,137 @@
+# Copyright (C) 2020  Christian Czepluch
+#
+# This file is part of CC-PIM.
+#
+# CC-PIM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC-PIM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC-PIM.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import inspect
+import struct
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Iterable, Optional, BinaryIO
+from zipfile import ZipFile, BadZipFile
+
+from tasks.db import DB, Row
+
+TaskSerial = int
+
+_LOCAL_HEADER = struct.Struct('<4s22sHH')  # signature, ..., file name length, extra field length
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+_FLAG_ENCRYPTED = 0x1
+
+
+@dataclass
+class ZipMember:
+    """ entry of the central directory of a zip file """
+    name: str
+    file_size: int
+    compress_size: int
+    crc: int
+    header_offset: int
+    compress_type: int
+    flag_bits: int
+
+
+def read_zip_members(zip_file: ZipFile) -> List[ZipMember]:
+    return [ZipMember(name=zip_info.filename, file_size=zip_info.file_size, compress_size=zip_info.compress_size,
+                      crc=zip_info.CRC, header_offset=zip_info.header_offset,
+                      compress_type=zip_info.compress_type, flag_bits=zip_info.flag_bits)
+            for zip_info in zip_file.infolist()]
+
+
+def _seek_member_data(fh: BinaryIO, member: ZipMember) -> None:
+    if member.flag_bits & _FLAG_ENCRYPTED:
+        raise BadZipFile(f'{member.name}: encrypted members are not supported')
+    fh.seek(member.header_offset)
+    header = fh.read(_LOCAL_HEADER.size)
+    if len(header) != _LOCAL_HEADER.size:
+        raise BadZipFile(f'{member.name}: truncated local header')
+    signature, _, name_len, extra_len = _LOCAL_HEADER.unpack(header)
+    if signature != _LOCAL_HEADER_SIGNATURE:
+        raise BadZipFile(f'{member.name}: bad local header')
+    fh.seek(name_len + extra_len, 1)
+
+
+def _can_open_indexed() -> bool:
+    """ checks the zipfile internals needed to open an indexed member, else the central directory is parsed """
+    ok = hasattr(zipfile, 'ZipExtFile') \
+        and 'close_fileobj' in inspect.signature(zipfile.ZipExtFile.__init__).parameters
+    if not ok:
+        print('zipfile internals changed => zip members are opened without the index')
+    return ok
+
+
+_CAN_OPEN_INDEXED = _can_open_indexed()
+
+
+def open_zipped_file(zip_fpath: Path, member_name: str, member: Optional[ZipMember] = None) -> BinaryIO:
+    """ opens the member for streaming, e.g. to read only its head
+
+        The indexed member is read at its offset, without parsing the central directory of the zip file.
+    """
+    if member is None or not _CAN_OPEN_INDEXED:
+        with ZipFile(zip_fpath, 'r') as zip_file:
+            return zip_file.open(member_name)  # keeps the zip file open until the stream is closed
+    fh = zip_fpath.open('rb')
+    try:
+        _seek_member_data(fh, member)
+        zip_info = zipfile.ZipInfo(member.name)
+        zip_info.compress_type = member.compress_type
+        zip_info.compress_size = member.compress_size
+        zip_info.file_size = member.file_size
+        zip_info.CRC = member.crc
+        zip_info.flag_bits = member.flag_bits
+        # uses zipfile internals, see _can_open_indexed()
+        return zipfile.ZipExtFile(fh, 'r', zip_info, close_fileobj=True)  # decompresses only what is read
+    except BaseException:
+        fh.close()
+        raise
+
+
+class ZipMemberIndex:
+    """ the members of the task zip files in tasks.sqlite (written together with the task caches) """
+    TABLE_NAME = 'task_zip_members'
+
+    def __init__(self, db: DB):
+        self._table = db.table(self.TABLE_NAME)
+
+    def remove_tasks(self, task_serials: Iterable[TaskSerial]) -> None:
+        self._table.delete_many('task_serial = ?', ((task_serial,) for task_serial in task_serials))
+
+    def insert_members(self, task_serial: TaskSerial, members: Iterable[ZipMember]) -> None:
+        """ a name can occur more than once in a zip file (appended members), the last one wins like in ZipFile """
+        members_by_name = {member.name: member for member in members}
+        self._table.insert_many(Row({'task_serial': task_serial, 'name': member.name,
+                                     'file_size': member.file_size, 'compress_size': member.compress_size,
+                                     'crc': member.crc, 'header_offset': member.header_offset,
+                                     'compress_type': member.compress_type, 'flag_bits': member.flag_bits},
+                                    self._table)
+                                for member in members_by_name.values())
+
+    def get_members(self, task_serial: TaskSerial) -> List[ZipMember]:
+        rows = self._table.select(where_str='task_serial = ?', where_params=(task_serial,))
+        return [self._create_member(row) for row in rows]
+
+    def find_member(self, task_serial: TaskSerial, name: str) -> Optional[ZipMember]:
+        rows = self._table.select(where_str='task_serial = ? and name = ?', where_params=(task_serial, name))
+        return self._create_member(rows[0]) if rows else None
+
+    @staticmethod
+    def _create_member(row) -> ZipMember:
+        return ZipMember(name=row['name'], file_size=row['file_size'], compress_size=row['compress_size'],
+                         crc=row['crc'], header_offset=row['header_offset'],
+                         compress_type=row['compress_type'], flag_bits=row['flag_bits'])
@@ -1,23 +1,193 @@
 import os
 import shutil
+import tempfile
+import threading
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
-from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
-from typing import Tuple
+from zipfile import ZipFile, ZipInfo, ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA
+from typing import Tuple, Optional, Iterator, Deque, List, Set, Dict, Callable
+
+from tasks.walking import walk
+
+COMPRESSIONS: Dict[str, int] = {
+    'stored': ZIP_STORED,
+    'deflated': ZIP_DEFLATED,
+    'bzip2': ZIP_BZIP2,
+    'lzma': ZIP_LZMA,  # ignores the level
+}
+
+# formats, which are compressed already
+DEFAULT_STORED_SUFFIXES = {
+    '.7z', '.avi', '.bz2', '.docx', '.flac', '.gif', '.gz', '.jpeg', '.jpg', '.m4a', '.mkv', '.mov', '.mp3',
+    '.mp4', '.odp', '.ods', '.odt', '.ogg', '.pdf', '.png', '.pptx', '.rar', '.webm', '.webp', '.xlsx', '.xz',
+    '.zip',
+}
+
+
+@dataclass
+class CompressionPolicy:
+    """ chooses the compression of the archive members by the suffix and size of the files """
+    compression: int = ZIP_DEFLATED
+    default_level: int = 6
+    size_levels: List[Tuple[int, int]] = field(default_factory=list)  # (max. file size, level), ascending sizes
+    stored_suffixes: Set[str] = field(default_factory=lambda: set(DEFAULT_STORED_SUFFIXES))  # lower case
+
+    def get_compression(self, fname: str, file_size: int) -> Tuple[int, Optional[int]]:
+        """ returns compress type and level """
+        if self.compression == ZIP_STORED or os.path.splitext(fname)[1].lower() in self.stored_suffixes:
+            return ZIP_STORED, None
+        for max_size, level in self.size_levels:
+            if file_size <= max_size:
+                return self.compression, level
+        return self.compression, self.default_level
+
+
+LEGACY_POLICY = CompressionPolicy(stored_suffixes=set())  # deflate level 6 for all files
+
+# no public attribute, renamed in Python 3.13 (zipfile uses it in ZipFile.open())
+_COMPRESS_LEVEL_ATTR = 'compress_level' if hasattr(ZipInfo, 'compress_level') else '_compresslevel'
+
+ProgressCallback = Callable[[int, int], None]  # processed bytes, total bytes
+
+
+class ArchiveCanceled(Exception):
+    pass
+
+
+class _ProgressTracker:
+
+    def __init__(self, total_size: int, progress: Optional[ProgressCallback],
+                 cancel_event: Optional[threading.Event]):
+        self._total_size = total_size
+        self._done_size = 0
+        self._progress = progress
+        self._cancel_event = cancel_event
+
+    def check_canceled(self) -> None:
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise ArchiveCanceled()
+
+    def add(self, size: int) -> None:
+        self._done_size += size
+        if self._progress is not None:
+            self._progress(self._done_size, self._total_size)
 
 
 class Zipper:
+    CHUNK_SIZE = 1024 * 1024  # the files are streamed, so the memory usage doesn't depend on the file sizes
+    MAX_IN_MEMORY_SIZE = 16 * 1024 * 1024  # bigger files are compressed by the workers into temp. files
 
-    def __init__(self, source_dpath: Path):
+    def __init__(self, source_dpath: Path, max_workers: int = 1, policy: Optional[CompressionPolicy] = None,
+                 zip_fpath: Optional[Path] = None):
+        """ max_workers > 1: the files are compressed in a process pool, the archive is assembled sequentially
+            zip_fpath: default is <source_dpath>.zip
+        """
         self._source_dpath = source_dpath
+        self._max_workers = max_workers
+        self._policy = policy if policy is not None else CompressionPolicy()
+        self._zip_fpath = zip_fpath if zip_fpath is not None else Path(str(source_dpath) + '.zip')
+        self._tracker = _ProgressTracker(0, None, None)
 
-    def start(self):
+    def start(self, progress: Optional[ProgressCallback] = None, cancel_event: Optional[threading.Event] = None):
+        """ raises ArchiveCanceled, if cancel_event is set; the partial zip file is removed on errors """
         source_dpath = self._source_dpath
-        zip_fpath = str(source_dpath) + '.zip'
-        with ZipFile(zip_fpath, 'x', compression=ZIP_DEFLATED, compresslevel=6) as zip_file:
-            self._zip_dir_recursive(zip_file, source_dpath, Path())
+        zip_fpath = self._zip_fpath
+        total_size = 0
+        if progress is not None:
+            total_size = sum(entry.size for entry in walk(source_dpath, with_stat=True) if not entry.is_dir)
+        self._tracker = _ProgressTracker(total_size, progress, cancel_event)
+        zip_file = ZipFile(zip_fpath, 'x', compression=ZIP_DEFLATED)
+        try:
+            with zip_file:
+                if self._max_workers > 1 and _can_write_compressed(zip_file):
+                    self._zip_dir_parallel(zip_file, source_dpath)
+                else:
+                    self._zip_dir_recursive(zip_file, source_dpath, Path())
+                self._tracker.check_canceled()
+        except BaseException:
+            os.remove(zip_fpath)
+            raise
         shutil.copystat(source_dpath, zip_fpath)
 
+    def _zip_dir_parallel(self, zip_file: ZipFile, source_dpath: Path):
+        with tempfile.TemporaryDirectory(dir=self._zip_fpath.parent) as temp_dname, \
+                ProcessPoolExecutor(max_workers=self._max_workers) as executor:
+            try:
+                # limits the number of compressed files, which wait in memory for being written
+                pending: Deque[Tuple[ZipInfo, Optional[Path], Optional[Future]]] = deque()
+                for i, (path, rel_path) in enumerate(self._iter_paths(source_dpath, Path())):
+                    self._tracker.check_canceled()
+                    if path.is_dir():
+                        pending.append((self._create_dir_info(path, rel_path), None, None))
+                        continue
+                    zip_info = self._create_file_info(path, rel_path)
+                    future = None
+                    if zip_info.compress_type != ZIP_STORED:  # stored files are copied directly
+                        temp_fpath = os.path.join(temp_dname, str(i))
+                        future = executor.submit(_compress_file, str(path), zip_info.compress_type,
+                                                 getattr(zip_info, _COMPRESS_LEVEL_ATTR), self.MAX_IN_MEMORY_SIZE,
+                                                 temp_fpath)
+                    pending.append((zip_info, path, future))
+                    self._flush_pending(zip_file, pending, 2 * self._max_workers)
+                self._flush_pending(zip_file, pending, 0)
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+
+    def _flush_pending(self, zip_file: ZipFile, pending: Deque[Tuple[ZipInfo, Optional[Path], Optional[Future]]],
+                       max_pending: int):
+        while len(pending) > max_pending:
+            self._tracker.check_canceled()
+            zip_info, source_fpath, future = pending.popleft()
+            if source_fpath is None:
+                zip_file.writestr(zip_info, b'')
+            elif future is None:
+                self._zip_copy_file(zip_file, zip_info, source_fpath)
+            else:
+                crc, file_size, data, temp_fpath = future.result()
+                zip_info.CRC = crc
+                zip_info.file_size = file_size
+                if data is not None:
+                    zip_info.compress_size = len(data)
+                    self._zip_write_compressed(zip_file, zip_info, [data])
+                else:
+                    zip_info.compress_size = os.path.getsize(temp_fpath)
+                    with open(temp_fpath, 'rb') as fh:
+                        self._zip_write_compressed(zip_file, zip_info, iter(lambda: fh.read(self.CHUNK_SIZE), b''))
+                    os.remove(temp_fpath)
+                self._tracker.add(file_size)
+
+    @staticmethod
+    def _zip_write_compressed(zip_file: ZipFile, zip_info: ZipInfo, chunks: Iterator[bytes]):
+        """ appends an already compressed member (zipfile has no public API for it, like ZipFile.write())
+
+            Uses zipfile internals, see _can_write_compressed().
+        """
+        zip_file._writecheck(zip_info)
+        if zip_info.compress_type == ZIP_LZMA:
+            zip_info.flag_bits |= 0x02  # EOS marker is used, like ZipFile.open(mode='w')
+        zip_file._didModify = True
+        zip_info.header_offset = zip_file.fp.tell()
+        zip_file.fp.write(zip_info.FileHeader())
+        for chunk in chunks:
+            zip_file.fp.write(chunk)
+        zip_file.start_dir = zip_file.fp.tell()
+        zip_file.filelist.append(zip_info)
+        zip_file.NameToInfo[zip_info.filename] = zip_info
+
+    def _iter_paths(self, source_dpath: Path, rel_dpath: Path) -> Iterator[Tuple[Path, Path]]:
+        """ same order as _zip_dir_recursive() """
+        for path in source_dpath.iterdir():
+            rel_path = rel_dpath / path.name
+            yield path, rel_path
+            if path.is_dir():
+                yield from self._iter_paths(path, rel_path)
+
     def _zip_dir_recursive(self, zip_file: ZipFile, source_dpath: Path, rel_dpath: Path):
         for path in source_dpath.iterdir():
             rel_path = rel_dpath / path.name
@@ -29,24 +199,38 @@ class Zipper:
 
     def _zip_write_dir(self, zip_file: ZipFile, source_dpath: Path, rel_dpath: Path):
         # print(f'{rel_dpath}...')
+        zip_info = self._create_dir_info(source_dpath, rel_dpath)
+        zip_file.writestr(zip_info, b'')
+
+    def _create_dir_info(self, source_dpath: Path, rel_dpath: Path) -> ZipInfo:
         dt_tuple = self._get_datetime_tuple(source_dpath)
 
         # zip_info = ZipInfo(str(rel_dpath) + '/', dt_tuple)
         zip_info = ZipInfo.from_file(source_dpath, arcname=str(rel_dpath) + '/')
         zip_info.compress_type = ZIP_DEFLATED
         zip_info.date_time = dt_tuple
-
-        zip_file.writestr(zip_info, b'')
+        return zip_info
 
     def _zip_write_file(self, zip_file: ZipFile, source_fpath: Path, rel_fpath: Path):
-        with source_fpath.open('rb') as fh:
-            dt_tuple = self._get_datetime_tuple(source_fpath)
-            # print(f'rel_fpath={rel_fpath}')
-            zip_info = ZipInfo(str(rel_fpath), dt_tuple)
-            zip_info.compress_type = ZIP_DEFLATED
+        # print(f'rel_fpath={rel_fpath}')
+        zip_info = self._create_file_info(source_fpath, rel_fpath)
+        self._zip_copy_file(zip_file, zip_info, source_fpath)
+
+    def _zip_copy_file(self, zip_file: ZipFile, zip_info: ZipInfo, source_fpath: Path):
+        with source_fpath.open('rb') as fh, zip_file.open(zip_info, 'w') as zip_fh:
+            for chunk in iter(lambda: fh.read(self.CHUNK_SIZE), b''):
+                self._tracker.check_canceled()
+                zip_fh.write(chunk)
+                self._tracker.add(len(chunk))
 
-            data = fh.read()
-            zip_file.writestr(zip_info, data)
+    def _create_file_info(self, source_fpath: Path, rel_fpath: Path) -> ZipInfo:
+        file_stat = source_fpath.stat()
+        zip_info = ZipInfo(str(rel_fpath), self._get_datetime_tuple(source_fpath))
+        zip_info.file_size = file_stat.st_size  # zipfile needs it to decide about zip64
+        compress_type, level = self._policy.get_compression(source_fpath.name, file_stat.st_size)
+        zip_info.compress_type = compress_type
+        setattr(zip_info, _COMPRESS_LEVEL_ATTR, level)
+        return zip_info
 
     @staticmethod
     def _get_datetime_tuple(path: Path) -> Tuple[int, int, int, int, int, int]:
@@ -55,19 +239,72 @@ class Zipper:
         return utc.year, utc.month, utc.day, utc.hour, utc.minute, utc.second
 
 
+def _can_write_compressed(zip_file: ZipFile) -> bool:
+    """ checks the zipfile internals needed by the process-pool mode, else the files are zipped sequentially """
+    ok = all(hasattr(zip_file, name) for name in ('_writecheck', '_didModify', 'fp', 'start_dir', 'filelist',
+                                                  'NameToInfo')) \
+        and hasattr(ZipInfo, 'FileHeader') and hasattr(zipfile, '_get_compressor')
+    if not ok:
+        print('zipfile internals changed => files are zipped sequentially')
+    return ok
+
+
+def _compress_file(source_fpath: str, compress_type: int, level: Optional[int], max_in_memory_size: int,
+                   temp_fpath: str) -> Tuple[int, int, Optional[bytes], Optional[str]]:
+    """ runs in a worker process, returns crc, file size and the compressed data (or the temp. file with it) """
+    compressor = zipfile._get_compressor(compress_type, level)  # same stream formats as ZipFile.open()
+    crc = 0
+    file_size = 0
+    chunks = []
+    compress_size = 0
+    temp_fh = None
+    try:
+        with open(source_fpath, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(Zipper.CHUNK_SIZE), b''):
+                crc = zlib.crc32(chunk, crc)
+                file_size += len(chunk)
+                compressed_chunk = compressor.compress(chunk)
+                chunks.append(compressed_chunk)
+                compress_size += len(compressed_chunk)
+                if temp_fh is None and compress_size > max_in_memory_size:
+                    temp_fh = open(temp_fpath, 'wb')
+                if temp_fh is not None:
+                    temp_fh.writelines(chunks)
+                    chunks.clear()
+        chunks.append(compressor.flush())
+        if temp_fh is not None:
+            temp_fh.writelines(chunks)
+            return crc, file_size, None, temp_fpath
+        return crc, file_size, b''.join(chunks), None
+    finally:
+        if temp_fh is not None:
+            temp_fh.close()
+
+
 class Unzipper:
 
     def __init__(self, zip_fpath: Path):
         self._zip_fpath = zip_fpath
 
-    def start(self):
+    def start(self, progress: Optional[ProgressCallback] = None, cancel_event: Optional[threading.Event] = None):
+        """ raises ArchiveCanceled, if cancel_event is set; the partial target dir is removed on errors """
         zip_fpath = self._zip_fpath
         target_dpath = zip_fpath.parent / zip_fpath.stem
         target_dpath.mkdir()
-        with ZipFile(zip_fpath, 'r') as zip_file:
-            zip_file.extractall(target_dpath)
-            for zip_info in zip_file.infolist():
-                self.adapt_mtime(target_dpath, zip_info)
+        try:
+            with ZipFile(zip_fpath, 'r') as zip_file:
+                zip_infos = zip_file.infolist()
+                tracker = _ProgressTracker(sum(zip_info.file_size for zip_info in zip_infos), progress, cancel_event)
+                for zip_info in zip_infos:
+                    tracker.check_canceled()
+                    zip_file.extract(zip_info, target_dpath)
+                    tracker.add(zip_info.file_size)
+                tracker.check_canceled()
+                for zip_info in zip_infos:
+                    self.adapt_mtime(target_dpath, zip_info)
+        except BaseException:
+            shutil.rmtree(target_dpath)
+            raise
         shutil.copystat(zip_fpath, target_dpath)
 
     @staticmethod